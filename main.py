@@ -1,7 +1,9 @@
 #!/usr/bin/env python3
 """程序入口点：ComfyUI 网格生图工具"""
 
+import os
 import sys
+from collections.abc import Sequence
 from pathlib import Path
 
 from dotenv import find_dotenv, load_dotenv
@@ -11,46 +13,65 @@ ROOT = Path(__file__).resolve().parents[0]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
-from scripts.generation.comfyui_part1_generate import main as generate_main
 from scripts.cli.io import MenuIO
 from scripts.cli.menu import run_menu
 
 MENU_FLAG = "--menu"
+SKIP_DOTENV_ENV = "SKIP_DOTENV"
+_TRUTHY_ENV_VALUES = frozenset({"1", "true", "yes", "on"})
 
 
-def _effective_argv(argv: list[str] | None) -> list[str]:
+def generate_main(argv: list[str] | None) -> int:
+    # 延迟导入：菜单/--menu 路径不需要 requests/websocket/tqdm
+    from scripts.generation.comfyui_part1_generate import main as _generate_main
+
+    return _generate_main(argv)
+
+
+def _effective_argv(argv: Sequence[str] | None) -> Sequence[str]:
     if argv is None:
-        return list(sys.argv[1:])
-    return list(argv)
+        return sys.argv[1:]
+    return argv
 
 
 def main(argv: list[str] | None = None) -> int:
     _autoload_dotenv()
     effective_argv = _effective_argv(argv)
-    io = MenuIO()
-    force_menu = MENU_FLAG in effective_argv
 
-    if force_menu:
+    if MENU_FLAG in effective_argv:
+        io = MenuIO()
         if not io.is_interactive():
             io.write("Error: --menu requires an interactive TTY (stdin/stdout).")
             return 2
 
-        extra_args = [item for item in effective_argv if item != MENU_FLAG]
-        if extra_args:
+        if any(item != MENU_FLAG for item in effective_argv):
             io.write("Notice: extra args are ignored in menu mode.")
         return run_menu(io)
 
-    if not effective_argv and io.is_interactive():
-        return run_menu(io)
+    if not effective_argv:
+        io = MenuIO()
+        if io.is_interactive():
+            return run_menu(io)
 
     return generate_main(argv)
 
 
 def _autoload_dotenv() -> None:
-    dotenv_path = find_dotenv(filename=".env", usecwd=True)
+    if os.environ.get(SKIP_DOTENV_ENV, "").strip().lower() in _TRUTHY_ENV_VALUES:
+        return
+    dotenv_path = _resolve_dotenv_path()
     if dotenv_path:
         _ = load_dotenv(dotenv_path=dotenv_path, encoding="utf-8")
 
 
+def _resolve_dotenv_path() -> str:
+    # 常见情况：.env 就在 cwd 下，一次 stat 即可，不必逐级向上遍历；
+    # 不做缓存，菜单运行期间新建/删除的 .env 下次调用就能生效
+    candidate = Path.cwd() / ".env"
+    if candidate.is_file():
+        return str(candidate)
+    return find_dotenv(filename=".env", usecwd=True)
+
+
 if __name__ == "__main__":
     sys.exit(main())
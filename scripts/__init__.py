@@ -1,30 +1,71 @@
 # pyright: reportMissingImports=false, reportUnknownVariableType=false
 
-from .generation.prompt_grid import (
-    MAX_SEED,
-    build_prompt_cell,
-    compute_prompt_hash,
-    derive_seed,
-    normalize_prompt,
-    read_x_descriptions,
-    read_x_rows,
-    read_y_rows,
-    render_positive_prompt,
-)
-from .generation.comfyui_client import (
-    ComfyUIClientError,
-    ComfyUIJobTimeoutError,
-    ComfyUIRequestError,
-    comfy_build_view_params,
-    comfy_build_ws_url,
-    comfy_download_image_bytes,
-    comfy_download_image_to_path,
-    comfy_get_history_item,
-    comfy_submit_prompt,
-    comfy_ws_connect,
-    comfy_ws_wait_prompt_done,
-)
-from .generation.workflow_patch import WorkflowOverrides, load_workflow, patch_workflow
+from __future__ import annotations
+
+import importlib
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .generation.comfyui_client import (
+        ComfyUIClientError,
+        ComfyUIJobTimeoutError,
+        ComfyUIRequestError,
+        comfy_build_view_params,
+        comfy_build_ws_url,
+        comfy_configure_http_pool,
+        comfy_download_image_bytes,
+        comfy_download_image_to_path,
+        comfy_download_images_to_paths,
+        comfy_get_history_item,
+        comfy_submit_prompt,
+        comfy_ws_connect,
+        comfy_ws_wait_prompt_done,
+    )
+    from .generation.prompt_grid import (
+        MAX_SEED,
+        build_prompt_cell,
+        compute_prompt_hash,
+        derive_seed,
+        normalize_prompt,
+        read_x_descriptions,
+        read_x_rows,
+        read_y_rows,
+        render_positive_prompt,
+    )
+    from .generation.workflow_patch import (
+        WorkflowOverrides,
+        load_workflow,
+        patch_workflow,
+    )
+
+# 按需导入（PEP 562）：`scripts.cli.*` 等轻量入口不应为 requests/websocket 付出导入开销
+_LAZY_EXPORTS: dict[str, str] = {
+    "MAX_SEED": ".generation.prompt_grid",
+    "build_prompt_cell": ".generation.prompt_grid",
+    "compute_prompt_hash": ".generation.prompt_grid",
+    "derive_seed": ".generation.prompt_grid",
+    "normalize_prompt": ".generation.prompt_grid",
+    "read_x_descriptions": ".generation.prompt_grid",
+    "read_x_rows": ".generation.prompt_grid",
+    "read_y_rows": ".generation.prompt_grid",
+    "render_positive_prompt": ".generation.prompt_grid",
+    "ComfyUIClientError": ".generation.comfyui_client",
+    "ComfyUIRequestError": ".generation.comfyui_client",
+    "ComfyUIJobTimeoutError": ".generation.comfyui_client",
+    "comfy_build_ws_url": ".generation.comfyui_client",
+    "comfy_submit_prompt": ".generation.comfyui_client",
+    "comfy_ws_connect": ".generation.comfyui_client",
+    "comfy_ws_wait_prompt_done": ".generation.comfyui_client",
+    "comfy_get_history_item": ".generation.comfyui_client",
+    "comfy_build_view_params": ".generation.comfyui_client",
+    "comfy_configure_http_pool": ".generation.comfyui_client",
+    "comfy_download_image_bytes": ".generation.comfyui_client",
+    "comfy_download_image_to_path": ".generation.comfyui_client",
+    "comfy_download_images_to_paths": ".generation.comfyui_client",
+    "WorkflowOverrides": ".generation.workflow_patch",
+    "load_workflow": ".generation.workflow_patch",
+    "patch_workflow": ".generation.workflow_patch",
+}
 
 __all__ = [
     "MAX_SEED",
@@ -45,9 +86,24 @@ __all__ = [
     "comfy_ws_wait_prompt_done",
     "comfy_get_history_item",
     "comfy_build_view_params",
+    "comfy_configure_http_pool",
     "comfy_download_image_bytes",
     "comfy_download_image_to_path",
+    "comfy_download_images_to_paths",
     "WorkflowOverrides",
     "load_workflow",
     "patch_workflow",
 ]
+
+
+def __getattr__(name: str) -> object:
+    module_name = _LAZY_EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted({*globals(), *__all__})
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from dataclasses import dataclass, field
 import sys
-from typing import Callable
+from typing import Callable, Sequence
 
 InputFunc = Callable[[str], str]
 PrintFunc = Callable[[str], None]
@@ -31,6 +31,9 @@ class MenuIO:
     print_func: PrintFunc = field(default_factory=lambda: print)
     stdin_isatty: IsATTYFunc = _stdin_isatty
     stdout_isatty: IsATTYFunc = _stdout_isatty
+    _interactive: bool | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
 
     def read(self, prompt: str = "") -> str:
         return self.input_func(prompt)
@@ -38,5 +41,15 @@ class MenuIO:
     def write(self, message: str) -> None:
         self.print_func(message)
 
+    def write_many(self, lines: Sequence[str]) -> None:
+        # 合并为一次输出调用，避免逐行 print 的加锁与 flush 开销
+        if lines:
+            self.write("\n".join(lines))
+
     def is_interactive(self) -> bool:
-        return self.stdin_isatty() and self.stdout_isatty()
+        if self._interactive is None:
+            self._interactive = self.stdin_isatty() and self.stdout_isatty()
+        return self._interactive
+
+    def invalidate(self) -> None:
+        self._interactive = None
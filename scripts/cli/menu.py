@@ -1,14 +1,19 @@
 from __future__ import annotations
 
-from collections.abc import Sequence
+from collections.abc import Callable, Sequence
 from dataclasses import dataclass
+import functools
 import os
+import re
 import shlex
+from types import MappingProxyType
 
 from .io import MenuIO
 from .registry import MenuEntry, iter_entries, load_entrypoint
 
 QUIT_TOKENS = frozenset({"q", "quit", "exit"})
+_YES_TOKENS = frozenset({"", "y", "yes"})
+_NO_TOKENS = frozenset({"n", "no"})
 GENERATE_ENTRY_KEY = "generate_grid"
 GENERATE_BASE_COMMAND = "uv run python scripts/generation/comfyui_part1_generate.py"
 CONVERT_X_BASE_COMMAND = "uv run python scripts/other/convert_x_csv_to_json.py"
@@ -18,6 +23,17 @@ DEFAULT_CONVERT_X_CSV = "data/prompts/X/common_prompts.csv"
 DEFAULT_CONVERT_Y_CSV = "data/prompts/Y/300_NAI_Styles_Table-test.csv"
 CONVERT_X_DEFAULT_ENV = "CONVERT_X_DEFAULT_CSV"
 CONVERT_Y_DEFAULT_ENV = "CONVERT_Y_DEFAULT_CSV"
+_MENU_HEADER_LINES = (
+    "",
+    "提示：无参+TTY 自动进入菜单；带参时透传到生图脚本。",
+    "提示：使用 --menu 强制进入菜单；非 TTY 会拒绝并提示。",
+    "提示：选择脚本后会打印可复制命令模板，并二次确认。",
+    "",
+)
+# 不含引号/转义/非常规空白时 str.split() 与 shlex.split() 结果一致
+_SHLEX_SPECIAL_CHARS = frozenset("\"'\\\x0b\x0c\x1c\x1d\x1e\x1f")
+# 与 shlex.quote 的"无需加引号"判定保持一致
+_SHLEX_SAFE_ARG = re.compile(r"[\w@%+=:,./-]+", re.ASCII)
 
 
 @dataclass(frozen=True, slots=True)
@@ -34,12 +50,40 @@ class ReadResult:
     exit_code: int | None = None
 
 
+@dataclass(frozen=True, slots=True)
+class _ArgvAction:
+    base_command: str
+    label: str
+    default_argv: Callable[[], tuple[str, ...]] | None = None
+
+
+@functools.lru_cache(maxsize=1)
 def _default_entries() -> tuple[MenuEntry, ...]:
     return tuple(iter_entries(include_disabled=True))
 
 
+def _ascii_lower(value: str) -> str:
+    # 常见输入（q/y/n）已是小写 ASCII，直接复用原字符串
+    if value.isascii() and value.islower():
+        return value
+    return value.lower()
+
+
+def _as_entries(entries: Sequence[MenuEntry] | None) -> tuple[MenuEntry, ...]:
+    if entries is None:
+        return _default_entries()
+    if isinstance(entries, tuple):
+        return entries
+    return tuple(entries)
+
+
 def build_menu_lines(entries: Sequence[MenuEntry] | None = None) -> tuple[str, ...]:
-    menu_entries = tuple(entries) if entries is not None else _default_entries()
+    menu_entries = _as_entries(entries)
+    return _menu_lines_for(menu_entries)
+
+
+@functools.lru_cache(maxsize=8)
+def _menu_lines_for(menu_entries: tuple[MenuEntry, ...]) -> tuple[str, ...]:
     lines = ["Available scripts:"]
     for index, entry in enumerate(menu_entries, start=1):
         suffix = "" if entry.enabled else " (disabled)"
@@ -48,11 +92,22 @@ def build_menu_lines(entries: Sequence[MenuEntry] | None = None) -> tuple[str, .
     return tuple(lines)
 
 
+@functools.lru_cache(maxsize=8)
+def _key_index_for(
+    menu_entries: tuple[MenuEntry, ...],
+) -> MappingProxyType[str, MenuEntry]:
+    index: dict[str, MenuEntry] = {}
+    for entry in menu_entries:
+        # 与原线性扫描一致：重复 key 时命中第一个
+        index.setdefault(entry.key, entry)
+    return MappingProxyType(index)
+
+
 def select_entry(
     raw_choice: str,
     entries: Sequence[MenuEntry] | None = None,
 ) -> MenuSelection:
-    menu_entries = tuple(entries) if entries is not None else _default_entries()
+    menu_entries = _as_entries(entries)
     choice = raw_choice.strip()
 
     if not choice:
@@ -60,8 +115,7 @@ def select_entry(
             raw=choice, entry=None, should_exit=False, error="Empty choice"
         )
 
-    lowered = choice.lower()
-    if lowered in QUIT_TOKENS:
+    if choice in QUIT_TOKENS or _ascii_lower(choice) in QUIT_TOKENS:
         return MenuSelection(raw=choice, entry=None, should_exit=True)
 
     if choice.isdigit():
@@ -76,7 +130,7 @@ def select_entry(
                 error="Choice out of range",
             )
     else:
-        matched = next((item for item in menu_entries if item.key == choice), None)
+        matched = _key_index_for(menu_entries).get(choice)
         if matched is None:
             return MenuSelection(
                 raw=choice,
@@ -103,7 +157,7 @@ def prompt_once(
     *,
     prompt: str = "Select an option: ",
 ) -> MenuSelection:
-    menu_entries = tuple(entries) if entries is not None else _default_entries()
+    menu_entries = _as_entries(entries)
     for line in build_menu_lines(menu_entries):
         io.write(line)
     raw_choice = io.read(prompt)
@@ -118,17 +172,13 @@ def run_menu(
     invalid_prefix: str = "Invalid selection: ",
     placeholder_message: str = "该选项即将支持，后续实现。",
 ) -> int:
-    menu_entries = tuple(entries) if entries is not None else _default_entries()
+    menu_entries = _as_entries(entries)
 
-    io.write("")
-    io.write("提示：无参+TTY 自动进入菜单；带参时透传到生图脚本。")
-    io.write("提示：使用 --menu 强制进入菜单；非 TTY 会拒绝并提示。")
-    io.write("提示：选择脚本后会打印可复制命令模板，并二次确认。")
-    io.write("")
+    io.write_many(_MENU_HEADER_LINES)
 
+    menu_lines = build_menu_lines(menu_entries)
     while True:
-        for line in build_menu_lines(menu_entries):
-            io.write(line)
+        io.write_many(menu_lines)
 
         choice_result = _safe_read(io, prompt)
         if choice_result.exit_code is not None:
@@ -142,118 +192,18 @@ def run_menu(
             io.write(f"{invalid_prefix}{selection.error}")
             continue
 
-        if selection.entry is not None and selection.entry.key == GENERATE_ENTRY_KEY:
-            extra_argv_result = _safe_read(io, "Extra argv (optional): ")
-            if extra_argv_result.exit_code is not None:
-                return extra_argv_result.exit_code
-            extra_argv_line = (extra_argv_result.value or "").strip()
-            try:
-                extra_argv = shlex.split(extra_argv_line)
-            except ValueError as exc:
-                io.write(f"{invalid_prefix}Invalid extra argv: {exc}")
-                continue
-
-            preview_command = _build_generate_preview_command(extra_argv)
-            io.write(f"Preview command: {preview_command}")
-
-            confirm_result = _safe_read(io, "Confirm execution? [Y/n]: ")
-            if confirm_result.exit_code is not None:
-                return confirm_result.exit_code
-            confirm = (confirm_result.value or "").strip().lower()
-            if confirm in {"", "y", "yes"}:
-                _run_selection_with_guard(
-                    io,
-                    selection,
-                    extra_argv,
-                    success_prefix="Generation finished with exit code: ",
-                )
-                continue
-            else:
-                if confirm not in {"n", "no"}:
-                    io.write("Invalid confirmation, cancelled.")
-                else:
-                    io.write("Generation cancelled.")
-                continue
-
-        if selection.entry is not None and selection.entry.key == "convert_x_csv":
-            extra_argv_result = _safe_read(io, "Extra argv (optional): ")
-            if extra_argv_result.exit_code is not None:
-                return extra_argv_result.exit_code
-            extra_argv_line = (extra_argv_result.value or "").strip()
-            try:
-                extra_argv = shlex.split(extra_argv_line)
-            except ValueError as exc:
-                io.write(f"{invalid_prefix}Invalid extra argv: {exc}")
-                continue
-
-            effective_argv = _resolve_convert_argv(
-                extra_argv, _default_convert_x_argv()
-            )
-            if not extra_argv:
-                io.write(
-                    f"No extra argv provided, using default: {shlex.join(effective_argv)}"
-                )
-            preview_command = _build_convert_x_preview_command(effective_argv)
-            io.write(f"Preview command: {preview_command}")
-
-            confirm_result = _safe_read(io, "Confirm execution? [Y/n]: ")
-            if confirm_result.exit_code is not None:
-                return confirm_result.exit_code
-            confirm = (confirm_result.value or "").strip().lower()
-            if confirm in {"", "y", "yes"}:
-                _run_selection_with_guard(
-                    io,
-                    selection,
-                    effective_argv,
-                    success_prefix="Convert finished with exit code: ",
-                )
-                continue
-            else:
-                if confirm not in {"n", "no"}:
-                    io.write("Invalid confirmation, cancelled.")
-                else:
-                    io.write("Convert cancelled.")
-                continue
-
-        if selection.entry is not None and selection.entry.key == "convert_y_csv":
-            extra_argv_result = _safe_read(io, "Extra argv (optional): ")
-            if extra_argv_result.exit_code is not None:
-                return extra_argv_result.exit_code
-            extra_argv_line = (extra_argv_result.value or "").strip()
-            try:
-                extra_argv = shlex.split(extra_argv_line)
-            except ValueError as exc:
-                io.write(f"{invalid_prefix}Invalid extra argv: {exc}")
-                continue
-
-            effective_argv = _resolve_convert_argv(
-                extra_argv, _default_convert_y_argv()
+        action = (
+            _ARGV_ACTIONS.get(selection.entry.key)
+            if selection.entry is not None
+            else None
+        )
+        if action is not None:
+            exit_code = _handle_with_argv(
+                io, selection, action, invalid_prefix=invalid_prefix
             )
-            if not extra_argv:
-                io.write(
-                    f"No extra argv provided, using default: {shlex.join(effective_argv)}"
-                )
-            preview_command = _build_convert_y_preview_command(effective_argv)
-            io.write(f"Preview command: {preview_command}")
-
-            confirm_result = _safe_read(io, "Confirm execution? [Y/n]: ")
-            if confirm_result.exit_code is not None:
-                return confirm_result.exit_code
-            confirm = (confirm_result.value or "").strip().lower()
-            if confirm in {"", "y", "yes"}:
-                _run_selection_with_guard(
-                    io,
-                    selection,
-                    effective_argv,
-                    success_prefix="Convert finished with exit code: ",
-                )
-                continue
-            else:
-                if confirm not in {"n", "no"}:
-                    io.write("Invalid confirmation, cancelled.")
-                else:
-                    io.write("Convert cancelled.")
-                continue
+            if exit_code is not None:
+                return exit_code
+            continue
 
         if selection.entry is not None and selection.entry.key == "upload_r2":
             preview_command = UPLOAD_R2_BASE_COMMAND
@@ -265,22 +215,67 @@ def run_menu(
         return 0
 
 
-def _build_generate_preview_command(extra_argv: list[str]) -> str:
-    if not extra_argv:
-        return GENERATE_BASE_COMMAND
-    return f"{GENERATE_BASE_COMMAND} {shlex.join(extra_argv)}"
+def _handle_with_argv(
+    io: MenuIO,
+    selection: MenuSelection,
+    action: _ArgvAction,
+    *,
+    invalid_prefix: str,
+) -> int | None:
+    extra_argv_result = _safe_read(io, "Extra argv (optional): ")
+    if extra_argv_result.exit_code is not None:
+        return extra_argv_result.exit_code
+    extra_argv_line = (extra_argv_result.value or "").strip()
+    try:
+        extra_argv = _split_argv(extra_argv_line)
+    except ValueError as exc:
+        io.write(f"{invalid_prefix}Invalid extra argv: {exc}")
+        return None
+
+    effective_argv = extra_argv
+    if action.default_argv is not None:
+        effective_argv = _resolve_convert_argv(extra_argv, action.default_argv())
+        if not extra_argv:
+            io.write(
+                f"No extra argv provided, using default: {_join_argv(effective_argv)}"
+            )
+    preview_command = _build_preview(action.base_command, effective_argv)
+    io.write(f"Preview command: {preview_command}")
+
+    confirm_result = _safe_read(io, "Confirm execution? [Y/n]: ")
+    if confirm_result.exit_code is not None:
+        return confirm_result.exit_code
+    confirm = _ascii_lower((confirm_result.value or "").strip())
+    if confirm in _YES_TOKENS:
+        _run_selection_with_guard(
+            io,
+            selection,
+            effective_argv,
+            success_prefix=f"{action.label} finished with exit code: ",
+        )
+    elif confirm not in _NO_TOKENS:
+        io.write("Invalid confirmation, cancelled.")
+    else:
+        io.write(f"{action.label} cancelled.")
+    return None
+
 
+def _build_preview(base_command: str, argv: list[str]) -> str:
+    if not argv:
+        return base_command
+    return f"{base_command} {_join_argv(argv)}"
 
-def _build_convert_x_preview_command(extra_argv: list[str]) -> str:
-    if not extra_argv:
-        return CONVERT_X_BASE_COMMAND
-    return f"{CONVERT_X_BASE_COMMAND} {shlex.join(extra_argv)}"
 
+def _split_argv(line: str) -> list[str]:
+    if line.isascii() and _SHLEX_SPECIAL_CHARS.isdisjoint(line):
+        return line.split()
+    return shlex.split(line)
 
-def _build_convert_y_preview_command(extra_argv: list[str]) -> str:
-    if not extra_argv:
-        return CONVERT_Y_BASE_COMMAND
-    return f"{CONVERT_Y_BASE_COMMAND} {shlex.join(extra_argv)}"
+
+def _join_argv(argv: Sequence[str]) -> str:
+    if all(_SHLEX_SAFE_ARG.fullmatch(arg) for arg in argv):
+        return " ".join(argv)
+    return shlex.join(argv)
 
 
 def _resolve_convert_argv(
@@ -309,6 +304,17 @@ def _default_convert_argv(env_name: str, fallback_csv: str) -> tuple[str, ...]:
     return (normalized,)
 
 
+_ARGV_ACTIONS: dict[str, _ArgvAction] = {
+    GENERATE_ENTRY_KEY: _ArgvAction(GENERATE_BASE_COMMAND, "Generation"),
+    "convert_x_csv": _ArgvAction(
+        CONVERT_X_BASE_COMMAND, "Convert", _default_convert_x_argv
+    ),
+    "convert_y_csv": _ArgvAction(
+        CONVERT_Y_BASE_COMMAND, "Convert", _default_convert_y_argv
+    ),
+}
+
+
 def _safe_read(io: MenuIO, prompt: str) -> ReadResult:
     try:
         return ReadResult(value=io.read(prompt))
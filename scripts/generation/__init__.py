@@ -4,8 +4,10 @@ from .comfyui_client import (
     ComfyUIRequestError,
     comfy_build_view_params,
     comfy_build_ws_url,
+    comfy_configure_http_pool,
     comfy_download_image_bytes,
     comfy_download_image_to_path,
+    comfy_download_images_to_paths,
     comfy_get_history_item,
     comfy_submit_prompt,
     comfy_ws_connect,
@@ -48,8 +50,10 @@ __all__ = [
     "comfy_ws_wait_prompt_done",
     "comfy_get_history_item",
     "comfy_build_view_params",
+    "comfy_configure_http_pool",
     "comfy_download_image_bytes",
     "comfy_download_image_to_path",
+    "comfy_download_images_to_paths",
     "WorkflowDict",
     "WorkflowOverrides",
     "load_workflow",
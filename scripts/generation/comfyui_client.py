@@ -1,22 +1,26 @@
 from __future__ import annotations
 
+import functools
 import json
 import logging
 import os
+import random
+import socket
 import tempfile
 import time
 import uuid
-from collections.abc import Callable, Iterator
+from collections.abc import Callable, Iterator, Sequence
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
 from pathlib import Path
-from typing import Protocol, cast
-from urllib.parse import ParseResult, quote, urlparse, urlunparse
+from typing import NoReturn, Protocol, cast
+from urllib.parse import ParseResult, quote, urlencode, urlparse, urlunparse
 
 import requests
 import websocket
+from requests.adapters import HTTPAdapter
 
 from scripts.generation.retry import retry_call
 
-
 LOG = logging.getLogger(__name__)
 
 
@@ -26,7 +30,64 @@ _HISTORY_GET_RETRYABLE_STATUSES = frozenset({429, 502, 503, 504})
 VIEW_GET_RETRY_MAX_ATTEMPTS = 5
 VIEW_GET_RETRY_STOP_AFTER_DELAY_S = 15.0
 _VIEW_GET_RETRYABLE_STATUSES = frozenset({429, 502, 503, 504})
-HISTORY_FALLBACK_POLL_INTERVAL_S = 0.25
+# 预先合并成单个集合：判定只需一次成员测试（None 不在集合内，自然返回 False）
+_HISTORY_TRANSIENT_STATUSES = _HISTORY_GET_RETRYABLE_STATUSES | frozenset(
+    range(500, 600)
+)
+_VIEW_TRANSIENT_STATUSES = _VIEW_GET_RETRYABLE_STATUSES | frozenset({404})
+# history 兜底轮询：从 BASE 开始指数退避到 CAP，每次乘以 [0.5, 1.0) 的抖动
+HISTORY_FALLBACK_POLL_BASE_S = 0.2
+HISTORY_FALLBACK_POLL_CAP_S = 3.0
+_TERMINAL_ERROR_MESSAGE_TYPES = frozenset({"execution_error", "execution_interrupted"})
+_INTERESTING_MESSAGE_TYPES = (
+    frozenset({"executing", "execution_success"}) | _TERMINAL_ERROR_MESSAGE_TYPES
+)
+VIEW_DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# 生成图可从服务端重新下载，默认只保证原子替换，不再逐张 fsync
+DOWNLOAD_FSYNC_ENV = "COMFYUI_DOWNLOAD_FSYNC"
+_SCALAR_CONTEXT_TYPES = (bool, int, float)
+_TRUTHY_ENV_VALUES = frozenset({"1", "true", "yes", "y", "on"})
+DOWNLOAD_MAX_WORKERS = 8
+HTTP_POOL_CONNECTIONS = 4
+HTTP_POOL_MAXSIZE = 16
+# websocket-client 默认已开启 TCP_NODELAY；这里显式固定，避免小的状态帧被 Nagle 延迟
+_WS_SOCKET_OPTIONS = ((socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),)
+
+
+def _mount_pooled_adapter(session: requests.Session, pool_maxsize: int) -> None:
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_CONNECTIONS,
+        pool_maxsize=pool_maxsize,
+        # 重试统一由 retry_call 负责，连接层不做隐式重试
+        max_retries=0,
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+
+def _build_session() -> requests.Session:
+    session = requests.Session()
+    _mount_pooled_adapter(session, HTTP_POOL_MAXSIZE)
+    return session
+
+
+# 进程级共享 Session：同一 ComfyUI host 的请求复用 keep-alive 连接（连接池线程安全）
+_SESSION = _build_session()
+_SESSION_POOL_MAXSIZE = HTTP_POOL_MAXSIZE
+
+
+def comfy_configure_http_pool(pool_maxsize: int) -> None:
+    # 按调用方的并发度调整共享连接池；并发超过池上限时多出的连接用完即丢，无法复用
+    global _SESSION_POOL_MAXSIZE
+    if pool_maxsize <= 0:
+        raise ValueError("pool_maxsize 必须 > 0")
+    if pool_maxsize == _SESSION_POOL_MAXSIZE:
+        return
+    # 菜单会在同一进程内反复运行：换上新 adapter 后关闭旧的，释放其连接池
+    old_adapter = _SESSION.get_adapter("http://")
+    _mount_pooled_adapter(_SESSION, pool_maxsize)
+    _SESSION_POOL_MAXSIZE = pool_maxsize
+    old_adapter.close()
 
 
 class ComfyUIClientError(RuntimeError):
@@ -42,7 +103,8 @@ class ComfyUIClientError(RuntimeError):
     ) -> None:
         super().__init__(message)
         self.code = code
-        self.context = dict(context or {})
+        # 不做防御性拷贝：调用方都传入新建的 dict，传入后不应再修改
+        self.context = context if context is not None else {}
 
     def as_metadata(self) -> dict[str, object]:
         return {
@@ -67,16 +129,12 @@ class ComfyUIJobTimeoutError(ComfyUIClientError):
 class WebSocketLike(Protocol):
     def settimeout(self, timeout: float) -> None: ...
 
-    def recv(self) -> object: ...
+    def recv_data(self) -> tuple[int, bytes]: ...
 
 
 def comfy_build_ws_url(base_url: str, client_id: str) -> str:
-    parsed = _parse_base_url(base_url)
-    scheme = "wss" if parsed.scheme == "https" else "ws"
-    path_prefix = parsed.path.rstrip("/")
-    ws_path = f"{path_prefix}/ws" if path_prefix else "/ws"
-    query = f"clientId={quote(client_id, safe='')}"
-    return urlunparse((scheme, parsed.netloc, ws_path, "", query, ""))
+    # client_id 每个格子都不同，只缓存与之无关的 ws 前缀
+    return f"{_build_ws_base_url(base_url)}?clientId={quote(client_id, safe='')}"
 
 
 def comfy_submit_prompt(
@@ -119,6 +177,9 @@ def comfy_ws_connect(
         ws: websocket.WebSocket = websocket.create_connection(  # pyright: ignore[reportUnknownMemberType]
             ws_url,
             timeout=request_timeout_s,
+            sockopt=_WS_SOCKET_OPTIONS,
+            # 帧内容随后由 JSON 解析器校验；跳过库内纯 Python 的逐字节 UTF-8 校验
+            skip_utf8_validation=True,
         )
         ws.settimeout(request_timeout_s)
         return ws
@@ -143,24 +204,34 @@ def comfy_ws_wait_prompt_done(
             context={"job_timeout_s": job_timeout_s},
         )
 
-    ws.settimeout(request_timeout_s)
-    started_at = time.monotonic()
+    prompt_id_bytes = prompt_id.encode("utf-8")
+    recv_timeout_s = request_timeout_s
+    ws.settimeout(recv_timeout_s)
+    now_fn = time.monotonic
+    started_at = now_fn()
+    deadline = started_at + job_timeout_s
 
     while True:
-        elapsed = time.monotonic() - started_at
-        if elapsed >= job_timeout_s:
+        now = now_fn()
+        if now >= deadline:
             raise ComfyUIJobTimeoutError(
                 f"job timeout while waiting prompt {prompt_id}",
                 code="job_timeout",
                 context={
                     "prompt_id": prompt_id,
                     "job_timeout_s": job_timeout_s,
-                    "elapsed_s": round(elapsed, 3),
+                    "elapsed_s": round(now - started_at, 3),
                 },
             )
+        # 临近 deadline 时收紧 recv 超时，避免最后一次阻塞越过 job_timeout；
+        # 只在变小时调用 settimeout，平时不为每帧多付一次系统调用
+        remaining_s = deadline - now
+        if remaining_s < recv_timeout_s:
+            recv_timeout_s = remaining_s
+            ws.settimeout(recv_timeout_s)
 
         try:
-            frame = ws.recv()
+            opcode, frame = ws.recv_data()
         except websocket.WebSocketTimeoutException:
             continue
         except Exception as exc:
@@ -170,20 +241,36 @@ def comfy_ws_wait_prompt_done(
                 context={"prompt_id": prompt_id},
             ) from exc
 
-        if not isinstance(frame, str):
+        # 只看文本帧；二进制帧是 ComfyUI 的预览图（非 JSON）。
+        # recv_data 直接给出原始 bytes，省去 recv() 内部的 UTF-8 解码
+        if opcode != websocket.ABNF.OPCODE_TEXT:
+            continue
+
+        # 进度帧占绝大多数：只有包含当前 prompt_id 且可能是终态的帧才需要解析 JSON
+        if prompt_id_bytes not in frame:
+            continue
+        # execution_start/execution_cached 等同样带 prompt_id，但不可能是终态；
+        # 缺少 node 键的 executing 帧与 node 为 null 一样视为完成，不能跳过
+        if (
+            b"execution_success" not in frame
+            and b"execution_error" not in frame
+            and b"execution_interrupted" not in frame
+            and b'"node": null' not in frame
+            and b'"node":null' not in frame
+            and (b'"executing"' not in frame or b'"node"' in frame)
+        ):
             continue
 
         try:
-            message_obj = cast(object, json.loads(frame))
-        except json.JSONDecodeError:
+            message_obj = json.loads(frame)
+        except ValueError:
             continue
 
         if not isinstance(message_obj, dict):
             continue
 
         message = cast(dict[str, object], message_obj)
-        _raise_if_terminal_error(message, prompt_id)
-        if _is_done_message(message, prompt_id):
+        if _is_prompt_done_frame(message, prompt_id):
             return
 
 
@@ -227,10 +314,9 @@ def comfy_wait_prompt_done_with_fallback(
         )
     finally:
         if ws is not None:
-            close_method = getattr(ws, "close", None)
-            if callable(close_method):
-                _ = close_method()
+            ws.close()
 
+    poll_index = 0
     while True:
         elapsed = time.monotonic() - started_at
         if elapsed >= job_timeout_s:
@@ -256,15 +342,29 @@ def comfy_wait_prompt_done_with_fallback(
         remaining_s = job_timeout_s - (time.monotonic() - started_at)
         if remaining_s <= 0:
             continue
-        time.sleep(min(HISTORY_FALLBACK_POLL_INTERVAL_S, remaining_s))
+        time.sleep(min(_history_fallback_poll_delay(poll_index), remaining_s))
+        poll_index += 1
+
+
+def _history_fallback_poll_delay(
+    poll_index: int, random_fn: Callable[[], float] = random.random
+) -> float:
+    backoff_s = HISTORY_FALLBACK_POLL_CAP_S
+    if poll_index < 16:
+        backoff_s = min(backoff_s, HISTORY_FALLBACK_POLL_BASE_S * (1 << poll_index))
+    return backoff_s * (0.5 + random_fn() * 0.5)
 
 
 def comfy_get_history_item(
     base_url: str,
     prompt_id: str,
     request_timeout_s: float = 30.0,
+    *,
+    max_attempts: int | None = None,
+    stop_after_delay_s: float | None = None,
 ) -> dict[str, object]:
-    url = _build_http_url(base_url, f"history/{prompt_id}")
+    # prompt_id 每次不同，只缓存固定前缀，避免挤占 view/prompt 的缓存槽位
+    url = f"{_build_http_url(base_url, 'history')}/{prompt_id}"
     on_retry, on_giveup = _build_get_retry_callbacks(default_url=url)
     response = retry_call(
         lambda: _request_history_item_with_transient_mapping(
@@ -272,8 +372,15 @@ def comfy_get_history_item(
             request_timeout_s=request_timeout_s,
         ),
         retry_exceptions=(ComfyUITransientRequestError,),
-        max_attempts=HISTORY_GET_RETRY_MAX_ATTEMPTS,
-        stop_after_delay_s=HISTORY_GET_RETRY_STOP_AFTER_DELAY_S,
+        # None 表示沿用模块默认值（调用时读取，便于测试 monkeypatch）
+        max_attempts=(
+            HISTORY_GET_RETRY_MAX_ATTEMPTS if max_attempts is None else max_attempts
+        ),
+        stop_after_delay_s=(
+            HISTORY_GET_RETRY_STOP_AFTER_DELAY_S
+            if stop_after_delay_s is None
+            else stop_after_delay_s
+        ),
         on_retry=on_retry,
         on_giveup=on_giveup,
     )
@@ -324,27 +431,85 @@ def comfy_download_image_to_path(
     image: dict[str, object],
     output_path: str | Path,
     request_timeout_s: float = 30.0,
+    *,
+    max_attempts: int | None = None,
+    stop_after_delay_s: float | None = None,
 ) -> Path:
     path = Path(output_path)
     path.parent.mkdir(parents=True, exist_ok=True)
-    url = _build_http_url(base_url, "view")
-    params = comfy_build_view_params(image)
+    # 查询串只编码一次，重试时直接复用完整 URL（与 requests 的 params 编码一致）
+    query = urlencode(comfy_build_view_params(image))
+    url = f"{_build_http_url(base_url, 'view')}?{query}"
     on_retry, on_giveup = _build_get_retry_callbacks(default_url=url)
     return retry_call(
         lambda: _download_view_image_once(
             url=url,
-            params=params,
             request_timeout_s=request_timeout_s,
             output_path=path,
         ),
         retry_exceptions=(ComfyUITransientRequestError,),
-        max_attempts=VIEW_GET_RETRY_MAX_ATTEMPTS,
-        stop_after_delay_s=VIEW_GET_RETRY_STOP_AFTER_DELAY_S,
+        max_attempts=(
+            VIEW_GET_RETRY_MAX_ATTEMPTS if max_attempts is None else max_attempts
+        ),
+        stop_after_delay_s=(
+            VIEW_GET_RETRY_STOP_AFTER_DELAY_S
+            if stop_after_delay_s is None
+            else stop_after_delay_s
+        ),
         on_retry=on_retry,
         on_giveup=on_giveup,
     )
 
 
+def comfy_download_images_to_paths(
+    base_url: str,
+    items: Sequence[tuple[dict[str, object], str | Path]],
+    request_timeout_s: float = 30.0,
+    max_workers: int = DOWNLOAD_MAX_WORKERS,
+    *,
+    max_attempts: int | None = None,
+    stop_after_delay_s: float | None = None,
+) -> list[Path]:
+    # 单张（batch_size=1 的常见情况）不值得起线程池；max_workers <= 1 时强制串行
+    if len(items) <= 1 or max_workers <= 1:
+        return [
+            comfy_download_image_to_path(
+                base_url,
+                image,
+                output_path,
+                request_timeout_s=request_timeout_s,
+                max_attempts=max_attempts,
+                stop_after_delay_s=stop_after_delay_s,
+            )
+            for image, output_path in items
+        ]
+
+    # 每张图各自走 comfy_download_image_to_path 的重试；结果按输入顺序返回
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as pool:
+        futures = [
+            pool.submit(
+                comfy_download_image_to_path,
+                base_url,
+                image,
+                output_path,
+                request_timeout_s,
+                max_attempts=max_attempts,
+                stop_after_delay_s=stop_after_delay_s,
+            )
+            for image, output_path in items
+        ]
+        _, not_done = wait(futures, return_when=FIRST_EXCEPTION)
+        if not_done:
+            # 已有一张失败：取消尚未开始的下载，并等正在进行的收尾，
+            # 保证抛出（调用方写 failed 记录）之后不会再有文件落盘
+            pool.shutdown(wait=True, cancel_futures=True)
+            for future in futures:
+                if not future.cancelled():
+                    # 按输入顺序取结果，第一张失败的会在这里抛出
+                    future.result()
+        return [future.result() for future in futures]
+
+
 def _build_get_retry_callbacks(
     *,
     default_url: str,
@@ -407,6 +572,7 @@ def _extract_request_log_fields(
     return method, url, status_code
 
 
+@functools.lru_cache(maxsize=16)
 def _parse_base_url(base_url: str) -> ParseResult:
     normalized = base_url.strip().rstrip("/")
     parsed = urlparse(normalized)
@@ -419,6 +585,16 @@ def _parse_base_url(base_url: str) -> ParseResult:
     return parsed
 
 
+@functools.lru_cache(maxsize=16)
+def _build_ws_base_url(base_url: str) -> str:
+    parsed = _parse_base_url(base_url)
+    scheme = "wss" if parsed.scheme == "https" else "ws"
+    path_prefix = parsed.path.rstrip("/")
+    ws_path = f"{path_prefix}/ws" if path_prefix else "/ws"
+    return urlunparse((scheme, parsed.netloc, ws_path, "", "", ""))
+
+
+@functools.lru_cache(maxsize=64)
 def _build_http_url(base_url: str, endpoint: str) -> str:
     parsed = _parse_base_url(base_url)
     path_prefix = parsed.path.rstrip("/")
@@ -436,12 +612,14 @@ def _request(
 ) -> requests.Response:
     try:
         if method == "POST":
-            response = requests.post(url, json=json_payload, timeout=request_timeout_s)
+            response = _SESSION.post(url, json=json_payload, timeout=request_timeout_s)
         elif method == "GET":
-            response = requests.get(url, timeout=request_timeout_s, params=params)
+            response = _SESSION.get(url, timeout=request_timeout_s, params=params)
         else:
             raise ValueError(f"unsupported method: {method}")
-        response.raise_for_status()
+        # 成功路径只做整数比较；raise_for_status 会先解码 reason 再判断状态码
+        if response.status_code >= 400:
+            response.raise_for_status()
         return response
     except requests.RequestException as exc:
         raise ComfyUIRequestError(
@@ -456,61 +634,45 @@ def _request_history_item_with_transient_mapping(
     url: str,
     request_timeout_s: float,
 ) -> requests.Response:
-    method = "GET"
-    try:
-        response = requests.get(url, timeout=request_timeout_s, params=None)
-        response.raise_for_status()
-        return response
-    except requests.HTTPError as exc:
-        status_code = _extract_status_code(exc)
-        context = _build_http_error_context(
-            method=method, url=url, status_code=status_code
-        )
-        if _is_transient_http_status_code(status_code):
-            raise ComfyUITransientRequestError(
-                "http request failed",
-                code="http_request_failed",
-                context=context,
-            ) from exc
-        raise ComfyUIRequestError(
-            "http request failed",
-            code="http_request_failed",
-            context=context,
-        ) from exc
-    except (requests.ConnectionError, requests.Timeout) as exc:
-        raise ComfyUITransientRequestError(
-            "http request failed",
-            code="http_request_failed",
-            context={"method": method, "url": url},
-        ) from exc
-    except requests.RequestException as exc:
-        status_code = _extract_status_code(exc)
-        context = _build_http_error_context(
-            method=method, url=url, status_code=status_code
-        )
-        raise ComfyUIRequestError(
-            "http request failed",
-            code="http_request_failed",
-            context=context,
-        ) from exc
+    return _get_with_transient_mapping(
+        url=url,
+        request_timeout_s=request_timeout_s,
+        stream=False,
+        is_transient_status=_is_transient_http_status_code,
+    )
 
 
 def _request_view_with_transient_mapping(
     *,
     url: str,
-    params: dict[str, str],
     request_timeout_s: float,
     stream: bool,
+) -> requests.Response:
+    return _get_with_transient_mapping(
+        url=url,
+        request_timeout_s=request_timeout_s,
+        stream=stream,
+        is_transient_status=_is_transient_view_status_code,
+    )
+
+
+def _get_with_transient_mapping(
+    *,
+    url: str,
+    request_timeout_s: float,
+    stream: bool,
+    is_transient_status: Callable[[int | None], bool],
 ) -> requests.Response:
     method = "GET"
     try:
-        response = requests.get(
+        response = _SESSION.get(
             url,
             timeout=request_timeout_s,
-            params=params,
+            params=None,
             stream=stream,
         )
-        response.raise_for_status()
+        if response.status_code >= 400:
+            response.raise_for_status()
         return response
     except requests.HTTPError as exc:
         status_code = _extract_status_code(exc)
@@ -519,7 +681,7 @@ def _request_view_with_transient_mapping(
             url=url,
             status_code=status_code,
         )
-        if _is_transient_view_status_code(status_code):
+        if is_transient_status(status_code):
             raise ComfyUITransientRequestError(
                 "http request failed",
                 code="http_request_failed",
@@ -553,13 +715,11 @@ def _request_view_with_transient_mapping(
 def _download_view_image_once(
     *,
     url: str,
-    params: dict[str, str],
     request_timeout_s: float,
     output_path: Path,
 ) -> Path:
     response = _request_view_with_transient_mapping(
         url=url,
-        params=params,
         request_timeout_s=request_timeout_s,
         stream=True,
     )
@@ -572,11 +732,16 @@ def _download_view_image_once(
             delete=False,
         ) as temp_file:
             temp_path = Path(temp_file.name)
-            for chunk in cast(Iterator[bytes], response.iter_content(chunk_size=8192)):
-                if chunk:
-                    _ = temp_file.write(chunk)
-            temp_file.flush()
-            os.fsync(temp_file.fileno())
+            # writelines 在 C 层迭代写入；仍走 iter_content，以保留 requests 的异常转换
+            temp_file.writelines(
+                cast(
+                    Iterator[bytes],
+                    response.iter_content(chunk_size=VIEW_DOWNLOAD_CHUNK_SIZE),
+                )
+            )
+            if _download_fsync_enabled():
+                temp_file.flush()
+                os.fsync(temp_file.fileno())
 
         os.replace(temp_path, output_path)
         replaced = True
@@ -606,13 +771,17 @@ def _download_view_image_once(
             context=context,
         ) from exc
     finally:
-        close_method = getattr(response, "close", None)
-        if callable(close_method):
-            _ = close_method()
+        response.close()
         if temp_path is not None and not replaced and temp_path.exists():
             temp_path.unlink()
 
 
+def _download_fsync_enabled() -> bool:
+    # 调用时读取：生图脚本在 import 之后才加载 .env
+    raw = os.environ.get(DOWNLOAD_FSYNC_ENV)
+    return raw is not None and raw.strip().lower() in _TRUTHY_ENV_VALUES
+
+
 def _extract_status_code(exc: requests.RequestException) -> int | None:
     response = exc.response
     if response is None:
@@ -637,26 +806,19 @@ def _build_http_error_context(
 
 
 def _is_transient_http_status_code(status_code: int | None) -> bool:
-    if status_code is None:
-        return False
-    if status_code in _HISTORY_GET_RETRYABLE_STATUSES:
-        return True
-    return 500 <= status_code <= 599
+    return status_code in _HISTORY_TRANSIENT_STATUSES
 
 
 def _is_transient_view_status_code(status_code: int | None) -> bool:
-    if status_code is None:
-        return False
-    if status_code == 404:
-        return True
-    return status_code in _VIEW_GET_RETRYABLE_STATUSES
+    return status_code in _VIEW_TRANSIENT_STATUSES
 
 
 def _response_json_dict(
     response: requests.Response, *, endpoint: str
 ) -> dict[str, object]:
     try:
-        body_obj = cast(object, response.json())
+        # 直接解析原始字节，跳过 requests 的解码层
+        body_obj = json.loads(response.content)
     except ValueError as exc:
         raise ComfyUIClientError(
             "invalid json response",
@@ -679,52 +841,37 @@ def _history_has_images(history_item: dict[str, object]) -> bool:
     if not isinstance(outputs_obj, dict):
         return False
 
-    outputs = cast(dict[str, object], outputs_obj)
-    for output_obj in outputs.values():
-        if not isinstance(output_obj, dict):
-            continue
-        output = cast(dict[str, object], output_obj)
-        images_obj = output.get("images")
-        if isinstance(images_obj, list) and len(cast(list[object], images_obj)) > 0:
-            return True
-    return False
+    # any() 在 C 层短路，命中第一个非空 images 列表即返回
+    return any(
+        isinstance(output_obj, dict)
+        and isinstance(images_obj := output_obj.get("images"), list)
+        and len(images_obj) > 0
+        for output_obj in cast(dict[str, object], outputs_obj).values()
+    )
 
 
-def _is_done_message(message: dict[str, object], prompt_id: str) -> bool:
+def _is_prompt_done_frame(message: dict[str, object], prompt_id: str) -> bool:
+    # 单次遍历：完成返回 True；当前 prompt 的终态错误直接抛出
+    # 先按 type 过滤：绝大多数帧在这里直接返回，不再访问 data
     message_type = message.get("type")
+    if message_type not in _INTERESTING_MESSAGE_TYPES:
+        return False
+
     data_obj = message.get("data")
     if not isinstance(data_obj, dict):
         return False
     data = cast(dict[str, object], data_obj)
-
-    message_prompt_id = data.get("prompt_id")
-    if not isinstance(message_prompt_id, str) or message_prompt_id != prompt_id:
+    if data.get("prompt_id") != prompt_id:
         return False
 
-    if message_type == "executing" and data.get("node") is None:
-        return True
-
-    if message_type == "execution_success":
-        return True
-
-    return False
-
-
-def _raise_if_terminal_error(message: dict[str, object], prompt_id: str) -> None:
-    message_type_obj = message.get("type")
-    if message_type_obj not in {"execution_error", "execution_interrupted"}:
-        return
-
-    data_obj = message.get("data")
-    if not isinstance(data_obj, dict):
-        return
-    data = cast(dict[str, object], data_obj)
+    if message_type in _TERMINAL_ERROR_MESSAGE_TYPES:
+        _raise_terminal_error(cast(str, message_type), data, prompt_id)
+    return message_type == "execution_success" or data.get("node") is None
 
-    message_prompt_id = data.get("prompt_id")
-    if not isinstance(message_prompt_id, str) or message_prompt_id != prompt_id:
-        return
 
-    message_type = cast(str, message_type_obj)
+def _raise_terminal_error(
+    message_type: str, data: dict[str, object], prompt_id: str
+) -> NoReturn:
     context: dict[str, object] = {"prompt_id": prompt_id}
     for key in ("node_id", "node_type", "exception_type", "exception_message"):
         value = _compact_context_value(data.get(key))
@@ -745,17 +892,18 @@ def _raise_if_terminal_error(message: dict[str, object], prompt_id: str) -> None
 
 
 def _compact_context_value(value: object, max_length: int = 200) -> object | None:
-    if value is None:
-        return None
-
-    if isinstance(value, bool | int | float):
-        return value
-
+    # 错误上下文里绝大多数是字符串，先判断 str
     if isinstance(value, str):
         if len(value) <= max_length:
             return value
         return f"{value[:max_length]}...(truncated)"
 
+    if value is None:
+        return None
+
+    if isinstance(value, _SCALAR_CONTEXT_TYPES):
+        return value
+
     text = repr(value)
     if len(text) <= max_length:
         return text
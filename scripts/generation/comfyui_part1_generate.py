@@ -3,17 +3,22 @@
 from __future__ import annotations
 
 import argparse
-from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from concurrent.futures import Future, ThreadPoolExecutor
 import hashlib
 import json
 import logging
 import os
+import queue
 import re
+import secrets
 import sys
+import tempfile
 import uuid
+from collections.abc import Iterator
 from dataclasses import dataclass
 from datetime import datetime, timezone
-from itertools import product
+from functools import lru_cache
+from itertools import count
 from pathlib import Path
 from time import monotonic, sleep
 from typing import cast
@@ -28,20 +33,23 @@ if __package__ in {None, ""}:
         sys.path.insert(0, str(ROOT))
 
 from scripts.generation.comfyui_client import (  # noqa: E402
+    DOWNLOAD_MAX_WORKERS,
     ComfyUIClientError,
-    comfy_download_image_to_path,
+    comfy_configure_http_pool,
+    comfy_download_images_to_paths,
     comfy_get_history_item,
     comfy_submit_prompt,
     comfy_wait_prompt_done_with_fallback,
 )
 from scripts.generation.prompt_grid import (  # noqa: E402
+    PROMPT_TEMPLATE_ORDER,
     X_INFO_TYPE_KEY,
-    compute_prompt_hash,
+    Sha256Hasher,
     derive_seed,
+    normalize_prompt,
     read_x_descriptions,
     read_x_rows,
     read_y_rows,
-    render_positive_prompt,
 )
 from scripts.generation.workflow_patch import (  # noqa: E402
     WorkflowDict,
@@ -61,6 +69,25 @@ DEFAULT_RUN_ROOT = "comfyui_api_outputs"
 
 LOG = logging.getLogger(__name__)
 
+# metadata.jsonl 的 fsync 批量阈值：累计行数或距上次 fsync 的时间，先到先触发
+METADATA_FSYNC_MAX_PENDING = 32
+METADATA_FSYNC_INTERVAL_S = 0.2
+# 设为真值时恢复逐行 fsync（更强的掉电保证，代价是每行一次磁盘往返）
+METADATA_FSYNC_EACH_RECORD_ENV = "COMFYUI_METADATA_FSYNC_EACH_RECORD"
+# 覆盖 history / view GET 的重试预算；未设置时沿用 comfyui_client 的默认值
+HISTORY_RETRY_MAX_ATTEMPTS_ENV = "COMFYUI_HISTORY_RETRY_MAX_ATTEMPTS"
+HISTORY_RETRY_STOP_AFTER_DELAY_ENV = "COMFYUI_HISTORY_RETRY_STOP_AFTER_DELAY_S"
+VIEW_RETRY_MAX_ATTEMPTS_ENV = "COMFYUI_VIEW_RETRY_MAX_ATTEMPTS"
+VIEW_RETRY_STOP_AFTER_DELAY_ENV = "COMFYUI_VIEW_RETRY_STOP_AFTER_DELAY_S"
+PROGRESS_UPDATE_MAX_PENDING = 16
+PROGRESS_UPDATE_INTERVAL_S = 0.1
+# history 轮询退避：50ms 起步逐次翻倍，封顶 400ms
+HISTORY_POLL_INITIAL_DELAY_S = 0.05
+HISTORY_POLL_MAX_DELAY_S = 0.4
+# 每个 cell 的 client_id 后缀：进程级随机前缀 + 递增计数（count 的 next 在 CPython 下线程安全）
+_CLIENT_ID_PREFIX = secrets.token_hex(4)
+_CLIENT_ID_COUNTER = count()
+
 ALLOWED_TEMPLATE_KEYS = {
     "gender",
     "characters",
@@ -105,11 +132,19 @@ class RunStats:
     resume_hit: int = 0
 
 
+@dataclass(slots=True)
+class _RetryBudget:
+    # None 表示沿用 comfyui_client 的默认值
+    history_max_attempts: int | None = None
+    history_stop_after_delay_s: float | None = None
+    view_max_attempts: int | None = None
+    view_stop_after_delay_s: float | None = None
+
+
 @dataclass(slots=True)
 class _CellPlan:
     x_index: int
     y_index: int
-    x_row: dict[str, str]
     y_value: str
     positive_prompt: str
     prompt_hash: str
@@ -118,6 +153,9 @@ class _CellPlan:
     workflow_hash: str
     save_image_prefix: str
     x_description: dict[str, str]
+    # 同一 x 行的所有 cell 共享同一个 x_fields dict（只读，仅用于写 metadata）
+    x_fields: dict[str, str]
+    x_info_type: str | None
 
 
 def _extract_x_info_type(x_row: dict[str, str]) -> str | None:
@@ -220,6 +258,17 @@ def build_parser() -> argparse.ArgumentParser:
         type=int,
         default=_env_optional_int("COMFYUI_CONCURRENCY") or 1,
     )
+    # 未单独指定时两者都沿用 --concurrency
+    parser.add_argument(
+        "--gen-concurrency",
+        type=int,
+        default=_env_optional_int("COMFYUI_GEN_CONCURRENCY"),
+    )
+    parser.add_argument(
+        "--dl-concurrency",
+        type=int,
+        default=_env_optional_int("COMFYUI_DL_CONCURRENCY"),
+    )
     parser.add_argument("--client-id", default=_env_str("COMFYUI_CLIENT_ID"))
 
     parser.add_argument(
@@ -269,8 +318,8 @@ def main(argv: list[str] | None = None) -> int:
 
 def run(args: argparse.Namespace) -> int:
     _validate_args(args)
+    retry_budget = _load_retry_budget()
     _configure_logging()
-
     x_rows = read_x_rows(args.x_json)
     y_rows = read_y_rows(args.y_json)
     x_descriptions = read_x_descriptions(args.x_json)
@@ -296,30 +345,43 @@ def run(args: argparse.Namespace) -> int:
         workflow_context.workflow_hash if workflow_context is not None else "not_loaded"
     )
 
+    x_desc_by_index = _selected_x_descriptions(x_selected, x_descriptions)
+
     run_payload = _build_run_payload(
         args=args,
         run_dir=run_artifacts.run_dir,
         x_selected=x_selected,
         y_selected=y_selected,
         workflow_context=workflow_context,
+        x_desc_by_index=x_desc_by_index,
     )
 
     run_id_obj = run_payload.get("run_id")
     if not isinstance(run_id_obj, str) or not run_id_obj:
         raise ValueError("run payload missing run_id")
     run_id = run_id_obj
-    run_artifacts.run_json_path.write_text(
-        json.dumps(run_payload, ensure_ascii=False, indent=2),
-        encoding="utf-8",
-    )
+    _write_bytes_atomic(run_artifacts.run_json_path, _dumps_json_pretty(run_payload))
 
     total_cells = len(x_selected) * len(y_selected)
-    example_prompt = _build_example_prompt(args.template, x_selected, y_selected)
+    compiled_template = _compile_template(args.template)
+    example_prompt = _build_example_prompt(compiled_template, x_selected, y_selected)
     if args.dry_run:
         print(f"组合总数: {total_cells}")
         print(f"示例正向提示词: {example_prompt}")
+    else:
+        # 连接池大小 = gen_concurrency + dl_concurrency * DOWNLOAD_MAX_WORKERS：
+        # 每个生成 worker 占一条连接，每个下载 worker 最多并发 DOWNLOAD_MAX_WORKERS 条；
+        # dry-run 不发请求，无需调整
+        comfy_configure_http_pool(
+            args.gen_concurrency + args.dl_concurrency * DOWNLOAD_MAX_WORKERS
+        )
 
-    latest_records = _load_latest_metadata_records(run_artifacts.metadata_path)
+    latest_records = _load_latest_metadata_records(
+        run_artifacts.metadata_path,
+        x_indexes=frozenset(item.index for item in x_selected),
+        y_indexes=frozenset(item.index for item in y_selected),
+    )
+    existing_image_names = _scan_existing_image_names(run_artifacts.images_dir)
 
     stats = RunStats()
     has_failed = False
@@ -341,15 +403,32 @@ def run(args: argparse.Namespace) -> int:
             with _metadata_writer(run_artifacts.metadata_path) as writer:
                 if not args.dry_run and workflow_context is None:
                     raise ValueError("非 dry-run 模式必须提供可用 workflow")
-
-                cell_iter = product(x_selected, y_selected)
+                # 非 dry-run 时上面已保证非 None；dry-run 不会提交生成任务
+                submit_workflow_context = cast(WorkflowContext, workflow_context)
+
+                cell_iter = _build_cell_plans(
+                    args=args,
+                    compiled_template=compiled_template,
+                    x_selected=x_selected,
+                    y_selected=y_selected,
+                    x_desc_by_index=x_desc_by_index,
+                    workflow_context=workflow_context,
+                    workflow_hash=workflow_hash,
+                    run_id=run_id,
+                )
                 exhausted = False
 
-                gen_futures: set[Future] = set()
-                dl_futures: set[Future] = set()
+                # id(future) -> 所属线程池（"gen" / "dl"）；未完成的 future 都登记在这里
+                future_kinds: dict[int, str] = {}
+                gen_inflight = 0
+                # 两个线程池的 future 完成时都投递到同一队列，主循环逐个取出处理
+                completions: queue.SimpleQueue[Future] = queue.SimpleQueue()
+                # 进度条按批刷新：累计若干条或超过间隔才调用一次 update/set_postfix
+                pending_progress = 0
+                last_progress_mono = monotonic()
 
                 def _write_record(record: dict[str, object]) -> None:
-                    nonlocal has_failed
+                    nonlocal has_failed, pending_progress
                     writer.append(record)
 
                     x_index_obj = record.get("x_index")
@@ -368,6 +447,18 @@ def run(args: argparse.Namespace) -> int:
                         if record.get("skip_reason") == "resume_hit":
                             stats.resume_hit += 1
 
+                    pending_progress += 1
+                    if (
+                        pending_progress >= PROGRESS_UPDATE_MAX_PENDING
+                        or monotonic() - last_progress_mono
+                        >= PROGRESS_UPDATE_INTERVAL_S
+                    ):
+                        _flush_progress()
+
+                def _flush_progress() -> None:
+                    nonlocal pending_progress, last_progress_mono
+                    if not pending_progress:
+                        return
                     pbar.set_postfix(
                         success=stats.success,
                         skipped=stats.skipped,
@@ -375,60 +466,43 @@ def run(args: argparse.Namespace) -> int:
                         resume_hit=stats.resume_hit,
                         refresh=False,
                     )
-                    pbar.update(1)
-
-                def _get_x_description(x_index: int) -> dict[str, str]:
-                    if x_index < len(x_descriptions):
-                        return x_descriptions[x_index]
-                    return {"zh": "", "en": ""}
+                    pbar.update(pending_progress)
+                    pending_progress = 0
+                    last_progress_mono = monotonic()
 
                 def _schedule_until_full(gen_pool: ThreadPoolExecutor) -> None:
-                    nonlocal exhausted
-                    while not exhausted and len(gen_futures) < args.concurrency:
+                    nonlocal exhausted, gen_inflight
+                    while not exhausted and gen_inflight < args.gen_concurrency:
                         try:
-                            x_item, y_item = next(cell_iter)
+                            plan = next(cell_iter)
                         except StopIteration:
                             exhausted = True
                             return
 
-                        x_index = x_item.index
-                        y_index = y_item.index
-                        x_row = x_item.value
-                        y_value = y_item.value.get("y", "")
-
-                        positive_prompt = _render_prompt_by_template(
-                            args.template, x_row, y_value
-                        )
-                        prompt_hash = compute_prompt_hash(positive_prompt)
-                        seed = derive_seed(args.base_seed, x_index, y_index)
-
-                        resume_record = latest_records.get((x_index, y_index))
+                        resume_record = latest_records.get((plan.x_index, plan.y_index))
                         if _should_resume_skip(
                             existing=resume_record,
                             run_dir=run_artifacts.run_dir,
-                            expected_prompt_hash=prompt_hash,
-                            expected_seed=seed,
+                            expected_prompt_hash=plan.prompt_hash,
+                            expected_seed=plan.seed,
                             expected_workflow_hash=workflow_hash,
+                            existing_image_names=existing_image_names,
                         ):
                             record = _build_base_metadata_record(
                                 status="skipped",
-                                x_index=x_index,
-                                y_index=y_index,
-                                x_row=x_row,
-                                y_value=y_value,
-                                positive_prompt=positive_prompt,
-                                prompt_hash=prompt_hash,
-                                seed=seed,
-                                generation_params=_effective_generation_params(
-                                    args,
-                                    workflow_context,
-                                    x_row,
-                                    seed,
-                                ),
+                                x_index=plan.x_index,
+                                y_index=plan.y_index,
+                                x_fields=plan.x_fields,
+                                x_info_type=plan.x_info_type,
+                                y_value=plan.y_value,
+                                positive_prompt=plan.positive_prompt,
+                                prompt_hash=plan.prompt_hash,
+                                seed=plan.seed,
+                                generation_params=plan.generation_params,
                                 workflow_hash=workflow_hash,
                             )
                             record["skip_reason"] = "resume_hit"
-                            record["x_description"] = _get_x_description(x_index)
+                            record["x_description"] = plan.x_description
                             record["local_image_path"] = _extract_local_image_path(
                                 resume_record
                             )
@@ -445,100 +519,74 @@ def run(args: argparse.Namespace) -> int:
                         if args.dry_run:
                             record = _build_base_metadata_record(
                                 status="skipped",
-                                x_index=x_index,
-                                y_index=y_index,
-                                x_row=x_row,
-                                y_value=y_value,
-                                positive_prompt=positive_prompt,
-                                prompt_hash=prompt_hash,
-                                seed=seed,
-                                generation_params=_effective_generation_params(
-                                    args,
-                                    workflow_context,
-                                    x_row,
-                                    seed,
-                                ),
+                                x_index=plan.x_index,
+                                y_index=plan.y_index,
+                                x_fields=plan.x_fields,
+                                x_info_type=plan.x_info_type,
+                                y_value=plan.y_value,
+                                positive_prompt=plan.positive_prompt,
+                                prompt_hash=plan.prompt_hash,
+                                seed=plan.seed,
+                                generation_params=plan.generation_params,
                                 workflow_hash=workflow_hash,
                             )
                             record["skip_reason"] = "dry_run"
-                            record["x_description"] = _get_x_description(x_index)
+                            record["x_description"] = plan.x_description
                             _write_record(record)
                             continue
 
-                        save_image_prefix = (
-                            f"{run_id}/x{x_index}-y{y_index}-s{seed}-{prompt_hash[:8]}"
-                        )
-                        x_desc = _get_x_description(x_index)
-                        plan = _CellPlan(
-                            x_index=x_index,
-                            y_index=y_index,
-                            x_row=x_row,
-                            y_value=y_value,
-                            positive_prompt=positive_prompt,
-                            prompt_hash=prompt_hash,
-                            seed=seed,
-                            generation_params=_effective_generation_params(
-                                args,
-                                workflow_context,
-                                x_row,
-                                seed,
-                            ),
-                            workflow_hash=workflow_hash,
-                            save_image_prefix=save_image_prefix,
-                            x_description=x_desc,
-                        )
-
                         future = gen_pool.submit(
                             _worker_submit_and_wait,
                             args,
-                            cast(WorkflowContext, workflow_context),
+                            submit_workflow_context,
                             plan,
                         )
-                        gen_futures.add(future)
+                        future_kinds[id(future)] = "gen"
+                        gen_inflight += 1
+                        future.add_done_callback(completions.put)
 
-                with ThreadPoolExecutor(max_workers=args.concurrency) as gen_pool:
-                    with ThreadPoolExecutor(max_workers=args.concurrency) as dl_pool:
+                with ThreadPoolExecutor(max_workers=args.gen_concurrency) as gen_pool:
+                    with ThreadPoolExecutor(max_workers=args.dl_concurrency) as dl_pool:
                         while True:
                             _schedule_until_full(gen_pool)
 
-                            if exhausted and not gen_futures and not dl_futures:
+                            if exhausted and not future_kinds:
                                 break
 
-                            if not gen_futures and not dl_futures:
+                            if not future_kinds:
                                 continue
 
-                            done, _ = wait(
-                                gen_futures | dl_futures,
-                                return_when=FIRST_COMPLETED,
-                            )
-
-                            for fut in done:
-                                if fut in gen_futures:
-                                    gen_futures.remove(fut)
-                                    outcome = cast(_GenOutcome, fut.result())
-                                    if outcome.record is not None:
-                                        _write_record(outcome.record)
-                                        continue
-                                    if outcome.download is not None:
-                                        dl_future = dl_pool.submit(
-                                            _worker_fetch_and_download,
-                                            args,
-                                            run_artifacts.run_dir,
-                                            outcome.download,
-                                        )
-                                        dl_futures.add(dl_future)
-                                        continue
-                                    raise RuntimeError(
-                                        "internal error: gen outcome missing record and download"
+                            fut = completions.get()
+                            kind = future_kinds.pop(id(fut), None)
+                            if kind == "gen":
+                                gen_inflight -= 1
+                                outcome: _GenOutcome = fut.result()
+                                if outcome.record is not None:
+                                    _write_record(outcome.record)
+                                    continue
+                                if outcome.download is not None:
+                                    dl_future = dl_pool.submit(
+                                        _worker_fetch_and_download,
+                                        args,
+                                        run_artifacts.run_dir,
+                                        outcome.download,
+                                        retry_budget,
                                     )
-
-                                if fut in dl_futures:
-                                    dl_futures.remove(fut)
-                                    record = cast(dict[str, object], fut.result())
-                                    _write_record(record)
+                                    future_kinds[id(dl_future)] = "dl"
+                                    dl_future.add_done_callback(completions.put)
                                     continue
+                                raise RuntimeError(
+                                    "internal error: gen outcome missing record and download"
+                                )
+
+                            if kind == "dl":
+                                record: dict[str, object] = fut.result()
+                                _write_record(record)
+                                continue
 
-                                raise RuntimeError("internal error: future not tracked")
+                            raise RuntimeError("internal error: future not tracked")
+
+                _flush_progress()
 
     print(
         "结果统计: "
@@ -549,6 +597,81 @@ def run(args: argparse.Namespace) -> int:
     return 1 if has_failed else 0
 
 
+def _selected_x_descriptions(
+    x_selected: list[SelectedRow],
+    x_descriptions: list[dict[str, str]],
+) -> dict[int, dict[str, str]]:
+    return {
+        item.index: (
+            x_descriptions[item.index]
+            if item.index < len(x_descriptions)
+            else {"zh": "", "en": ""}
+        )
+        for item in x_selected
+    }
+
+
+def _build_cell_plans(
+    *,
+    args: argparse.Namespace,
+    compiled_template: tuple[str, ...] | None,
+    x_selected: list[SelectedRow],
+    y_selected: list[SelectedRow],
+    x_desc_by_index: dict[int, dict[str, str]],
+    workflow_context: WorkflowContext | None,
+    workflow_hash: str,
+    run_id: str,
+) -> Iterator[_CellPlan]:
+    # 提示词、哈希、种子与参数只依赖输入；按调度节奏逐个产出，
+    # 内存只随在途 cell 数增长，x 行级的前缀状态在该行的 y 循环内复用
+    y_segments = [
+        _format_template_segment(item.value.get("y", "")) for item in y_selected
+    ]
+    # y 段落的规范化字节每列只算一次
+    y_normalized = [normalize_prompt(segment).encode() for segment in y_segments]
+
+    for x_item in x_selected:
+        x_index = x_item.index
+        x_row = x_item.value
+        x_segments = _prepare_x_segments(compiled_template, x_row)
+        head_hasher, tail_normalized = _prepare_prompt_hash_parts(x_segments)
+        x_fields = _project_x_fields(x_row)
+        x_info_type = _extract_x_info_type(x_row)
+        # 除 seed 外的生成参数（含按 x_info_type 追加的负面提示词）只与 x 行有关
+        x_generation_params = _effective_generation_params(
+            args, workflow_context, x_row, seed=0
+        )
+        for y_item, y_segment, y_bytes in zip(
+            y_selected, y_segments, y_normalized, strict=True
+        ):
+            y_index = y_item.index
+            y_value = y_item.value.get("y", "")
+
+            positive_prompt = _render_prepared_segments(x_segments, y_segment)
+            hasher = head_hasher.copy()
+            for tail_bytes in tail_normalized:
+                hasher.update(y_bytes)
+                hasher.update(tail_bytes)
+            prompt_hash = hasher.hexdigest()
+            seed = derive_seed(args.base_seed, x_index, y_index)
+            yield _CellPlan(
+                x_index=x_index,
+                y_index=y_index,
+                y_value=y_value,
+                positive_prompt=positive_prompt,
+                prompt_hash=prompt_hash,
+                seed=seed,
+                generation_params={**x_generation_params, "seed": seed},
+                workflow_hash=workflow_hash,
+                save_image_prefix=(
+                    f"{run_id}/x{x_index}-y{y_index}-s{seed}-{prompt_hash[:8]}"
+                ),
+                x_description=x_desc_by_index[x_index],
+                x_fields=x_fields,
+                x_info_type=x_info_type,
+            )
+
+
 def _configure_logging() -> None:
     root = logging.getLogger()
     if root.handlers:
@@ -568,6 +691,14 @@ def _validate_args(args: argparse.Namespace) -> None:
 
     if args.concurrency <= 0:
         raise ValueError("--concurrency 必须 > 0")
+    if args.gen_concurrency is None:
+        args.gen_concurrency = args.concurrency
+    if args.dl_concurrency is None:
+        args.dl_concurrency = args.concurrency
+    if args.gen_concurrency <= 0:
+        raise ValueError("--gen-concurrency 必须 > 0")
+    if args.dl_concurrency <= 0:
+        raise ValueError("--dl-concurrency 必须 > 0")
 
     if not args.dry_run:
         if not args.workflow_json:
@@ -577,6 +708,31 @@ def _validate_args(args: argparse.Namespace) -> None:
         args.client_id = str(uuid.uuid4())
 
 
+def _load_retry_budget() -> _RetryBudget:
+    # 启动时读取并校验一次，配置错误直接失败，而不是在每个下载线程里各报一次
+    budget = _RetryBudget(
+        history_max_attempts=_env_optional_int(HISTORY_RETRY_MAX_ATTEMPTS_ENV),
+        history_stop_after_delay_s=_env_optional_float(
+            HISTORY_RETRY_STOP_AFTER_DELAY_ENV
+        ),
+        view_max_attempts=_env_optional_int(VIEW_RETRY_MAX_ATTEMPTS_ENV),
+        view_stop_after_delay_s=_env_optional_float(VIEW_RETRY_STOP_AFTER_DELAY_ENV),
+    )
+    for name, attempts in (
+        (HISTORY_RETRY_MAX_ATTEMPTS_ENV, budget.history_max_attempts),
+        (VIEW_RETRY_MAX_ATTEMPTS_ENV, budget.view_max_attempts),
+    ):
+        if attempts is not None and attempts < 1:
+            raise ValueError(f"环境变量 {name} 必须 >= 1")
+    for name, delay_s in (
+        (HISTORY_RETRY_STOP_AFTER_DELAY_ENV, budget.history_stop_after_delay_s),
+        (VIEW_RETRY_STOP_AFTER_DELAY_ENV, budget.view_stop_after_delay_s),
+    ):
+        if delay_s is not None and delay_s < 0:
+            raise ValueError(f"环境变量 {name} 不能小于 0")
+    return budget
+
+
 def _prepare_run_artifacts(run_dir_arg: str | None) -> RunArtifacts:
     if run_dir_arg:
         run_dir = Path(run_dir_arg)
@@ -655,9 +811,12 @@ def _env_bool(name: str, default: bool) -> bool:
     )
 
 
+@lru_cache(maxsize=128)
 def _append_negative_prompt(base: str | None, append: str | None) -> str:
     """纯函数：拼接 base negative prompt 和 append negative prompt。
 
+    每个 normal 类型的 cell 都会调用，参数组合极少，按 (base, append) 缓存结果。
+
     Args:
         base: 基础负面提示词，None 视为空字符串
         append: 追加负面提示词，None 视为空字符串
@@ -756,24 +915,17 @@ def _parse_indexes(raw: str | None, axis_name: str) -> list[int] | None:
     if raw is None:
         return None
 
-    tokens = [token.strip() for token in raw.split(",") if token.strip()]
-    if not tokens:
-        return []
-
     parsed: list[int] = []
-    for token in tokens:
-        if not token.isdigit():
+    for token in raw.split(","):
+        stripped = token.strip()
+        if not stripped:
+            continue
+        if not stripped.isdigit():
             raise ValueError(f"--{axis_name}-indexes 仅支持非负整数列表: {raw}")
-        parsed.append(int(token))
+        parsed.append(int(stripped))
 
-    unique: list[int] = []
-    seen: set[int] = set()
-    for value in parsed:
-        if value in seen:
-            continue
-        seen.add(value)
-        unique.append(value)
-    return unique
+    # dict.fromkeys 保留首次出现的顺序完成去重
+    return list(dict.fromkeys(parsed))
 
 
 def _load_workflow_context(args: argparse.Namespace) -> WorkflowContext | None:
@@ -785,7 +937,8 @@ def _load_workflow_context(args: argparse.Namespace) -> WorkflowContext | None:
         raise ValueError("非 dry-run 模式缺少 workflow 路径")
 
     workflow_path = Path(workflow_json_path)
-    if not workflow_path.exists() or not workflow_path.is_file():
+    # is_file() 对不存在的路径同样返回 False，一次 stat 即可
+    if not workflow_path.is_file():
         raise ValueError(f"workflow 文件不存在: {workflow_json_path}")
 
     workflow = load_workflow(workflow_path)
@@ -922,6 +1075,7 @@ def _build_run_payload(
     x_selected: list[SelectedRow],
     y_selected: list[SelectedRow],
     workflow_context: WorkflowContext | None,
+    x_desc_by_index: dict[int, dict[str, str]],
 ) -> dict[str, object]:
     workflow_status = "loaded" if workflow_context is not None else "not_loaded"
     workflow_json_path: str | None = (
@@ -942,8 +1096,6 @@ def _build_run_payload(
         + uuid.uuid4().hex[:8]
     )
 
-    x_descriptions = read_x_descriptions(args.x_json)
-
     return {
         "run_id": run_id,
         "created_at": _now_iso(),
@@ -968,6 +1120,8 @@ def _build_run_payload(
         "request_timeout_s": args.request_timeout_s,
         "job_timeout_s": args.job_timeout_s,
         "concurrency": args.concurrency,
+        "gen_concurrency": args.gen_concurrency,
+        "dl_concurrency": args.dl_concurrency,
         "client_id": args.client_id,
         "selection": {
             "x_indexes": [item.index for item in x_selected],
@@ -979,9 +1133,7 @@ def _build_run_payload(
                 {
                     "x_index": item.index,
                     "type": _extract_x_info_type(item.value),
-                    "description": x_descriptions[item.index]
-                    if item.index < len(x_descriptions)
-                    else {"zh": "", "en": ""},
+                    "description": x_desc_by_index[item.index],
                 }
                 for item in x_selected
             ],
@@ -1005,7 +1157,7 @@ def _build_run_payload(
 
 
 def _build_example_prompt(
-    template: str,
+    compiled_template: tuple[str, ...] | None,
     x_selected: list[SelectedRow],
     y_selected: list[SelectedRow],
 ) -> str:
@@ -1013,60 +1165,106 @@ def _build_example_prompt(
         return ""
     first_x = x_selected[0].value
     first_y = y_selected[0].value.get("y", "")
-    return _render_prompt_by_template(template, first_x, first_y)
+    return _render_compiled_template(compiled_template, first_x, first_y)
 
 
-def _render_prompt_by_template(
-    template: str,
-    x_row: dict[str, str],
-    y_value: str,
-) -> str:
+@lru_cache(maxsize=32)
+def _compile_template(template: str) -> tuple[str, ...] | None:
+    # 默认模板返回 None（按 PROMPT_TEMPLATE_ORDER 渲染）；其余模板只解析一次为占位符序列
     if template == DEFAULT_TEMPLATE:
-        return render_positive_prompt(x_row, y_value)
-
-    key_map = {
-        "gender": x_row.get("gender", ""),
-        "characters": x_row.get("characters", ""),
-        "series": x_row.get("series", ""),
-        "rating": x_row.get("rating", ""),
-        "y": y_value,
-        "general": x_row.get("general", ""),
-        "quality": x_row.get("quality", ""),
-    }
+        return None
 
     stripped = TEMPLATE_TOKEN_RE.sub("", template)
     if stripped.strip():
         raise ValueError("--template 仅支持由占位符组成，例如 {gender}{y}{quality}")
 
-    rendered: list[str] = []
-    for match in TEMPLATE_TOKEN_RE.finditer(template):
-        key = match.group(1)
+    keys = tuple(TEMPLATE_TOKEN_RE.findall(template))
+    for key in keys:
         if key not in ALLOWED_TEMPLATE_KEYS:
             raise ValueError(f"--template 包含未知占位符: {{{key}}}")
-        segment = key_map[key].strip()
-        if not segment:
-            continue
-        if not segment.endswith(","):
-            segment = f"{segment},"
-        rendered.append(segment)
-    return "".join(rendered)
+    return keys
+
+
+def _render_compiled_template(
+    compiled_template: tuple[str, ...] | None,
+    x_row: dict[str, str],
+    y_value: str,
+) -> str:
+    return _render_prepared_segments(
+        _prepare_x_segments(compiled_template, x_row),
+        _format_template_segment(y_value),
+    )
+
+
+def _format_template_segment(value: str) -> str:
+    segment = value.strip()
+    if segment and not segment.endswith(","):
+        return f"{segment},"
+    return segment
+
+
+def _prepare_x_segments(
+    compiled_template: tuple[str, ...] | None,
+    x_row: dict[str, str],
+) -> tuple[str | None, ...]:
+    # 每个 x 行只格式化一次；"y" 的位置留 None，由各 cell 的 y 段落填入
+    template_keys = (
+        compiled_template if compiled_template is not None else PROMPT_TEMPLATE_ORDER
+    )
+    return tuple(
+        None if key == "y" else _format_template_segment(x_row.get(key, ""))
+        for key in template_keys
+    )
+
+
+def _prepare_prompt_hash_parts(
+    x_segments: tuple[str | None, ...],
+) -> tuple[Sha256Hasher, tuple[bytes, ...]]:
+    # 每个段落都已 strip 且以 "," 结尾（或为空），normalize_prompt 不会跨段落改写，
+    # 即 normalize(a + b) == normalize(a) + normalize(b)；因此按 y 槽位切开后：
+    # 首段预先喂进 sha256，其余各段规范化成字节，cell 只需 copy 后依次补上 y 与后续段
+    parts: list[str] = []
+    current: list[str] = []
+    for segment in x_segments:
+        if segment is None:
+            parts.append("".join(current))
+            current = []
+        else:
+            current.append(segment)
+    parts.append("".join(current))
+
+    head_hasher = hashlib.sha256(normalize_prompt(parts[0]).encode())
+    return head_hasher, tuple(normalize_prompt(part).encode() for part in parts[1:])
+
+
+def _render_prepared_segments(
+    x_segments: tuple[str | None, ...],
+    y_segment: str,
+) -> str:
+    return "".join(y_segment if segment is None else segment for segment in x_segments)
 
 
 def _load_latest_metadata_records(
     metadata_path: Path,
+    x_indexes: frozenset[int] | None = None,
+    y_indexes: frozenset[int] | None = None,
 ) -> dict[tuple[int, int], dict[str, object]]:
+    # 只保留本次选中 cell（x、y 的笛卡尔积）的最新有效记录，其余行解析后即丢弃；
+    # 每行只解析一次，续跑查询直接命中内存，不再回读文件
     latest: dict[tuple[int, int], dict[str, object]] = {}
-    if not metadata_path.exists():
+    try:
+        file = metadata_path.open("rb")
+    except FileNotFoundError:
         return latest
 
-    with metadata_path.open("r", encoding="utf-8") as file:
+    with file:
         for line in file:
             stripped = line.strip()
             if not stripped:
                 continue
             try:
                 payload = json.loads(stripped)
-            except json.JSONDecodeError:
+            except ValueError:
                 continue
             if not isinstance(payload, dict):
                 continue
@@ -1075,8 +1273,12 @@ def _load_latest_metadata_records(
             y_index = _coerce_int_or_none(payload.get("y_index"))
             if x_index is None or y_index is None:
                 continue
+            if x_indexes is not None and x_index not in x_indexes:
+                continue
+            if y_indexes is not None and y_index not in y_indexes:
+                continue
 
-            latest[(x_index, y_index)] = payload
+            latest[(x_index, y_index)] = cast(dict[str, object], payload)
 
     return latest
 
@@ -1087,6 +1289,7 @@ def _should_resume_skip(
     expected_prompt_hash: str,
     expected_seed: int,
     expected_workflow_hash: str,
+    existing_image_names: frozenset[str] | None = None,
 ) -> bool:
     if existing is None:
         return False
@@ -1112,22 +1315,38 @@ def _should_resume_skip(
 
     local_image_paths = _extract_local_image_paths(existing)
     if local_image_paths is not None:
-        for local_image_path in local_image_paths:
-            image_path = Path(local_image_path)
-            if not image_path.is_absolute():
-                image_path = run_dir / image_path
-            if not (image_path.exists() and image_path.is_file()):
-                return False
-        return True
+        return all(
+            _resume_image_exists(local_image_path, run_dir, existing_image_names)
+            for local_image_path in local_image_paths
+        )
 
     local_image_path = _extract_local_image_path(existing)
     if local_image_path is None:
         return False
+    return _resume_image_exists(local_image_path, run_dir, existing_image_names)
 
+
+def _scan_existing_image_names(images_dir: Path) -> frozenset[str]:
+    # 启动时列一次 images 目录，续跑判断改为内存查表，避免逐 cell stat
+    try:
+        with os.scandir(images_dir) as entries:
+            return frozenset(entry.name for entry in entries if entry.is_file())
+    except FileNotFoundError:
+        return frozenset()
+
+
+def _resume_image_exists(
+    local_image_path: str,
+    run_dir: Path,
+    existing_image_names: frozenset[str] | None,
+) -> bool:
     image_path = Path(local_image_path)
-    if not image_path.is_absolute():
-        image_path = run_dir / image_path
-    return image_path.exists() and image_path.is_file()
+    if image_path.is_absolute():
+        return image_path.is_file()
+    parts = image_path.parts
+    if existing_image_names is not None and len(parts) == 2 and parts[0] == "images":
+        return parts[1] in existing_image_names
+    return (run_dir / image_path).is_file()
 
 
 def _extract_local_image_path(existing: dict[str, object] | None) -> str | None:
@@ -1156,30 +1375,80 @@ def _extract_local_image_paths(existing: dict[str, object] | None) -> list[str]
     return paths if paths else None
 
 
+def _dumps_jsonl_line(record: dict[str, object]) -> bytes:
+    return (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def _dumps_json_pretty(payload: dict[str, object]) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+def _write_bytes_atomic(path: Path, data: bytes) -> None:
+    # 临时文件写完并 fsync 后再 os.replace，崩溃时不会留下半截 run.json
+    temp_path: Path | None = None
+    try:
+        with tempfile.NamedTemporaryFile(
+            mode="wb",
+            dir=str(path.parent),
+            prefix=f".{path.name}.",
+            suffix=".tmp",
+            delete=False,
+        ) as temp_file:
+            temp_path = Path(temp_file.name)
+            temp_file.write(data)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        os.replace(temp_path, path)
+        temp_path = None
+    finally:
+        if temp_path is not None:
+            temp_path.unlink(missing_ok=True)
+
+
 class _MetadataWriter:
+    # 每行写入后立即 flush（进程崩溃不丢记录）；fsync 按批进行，退出时补齐
     def __init__(self, path: Path) -> None:
         self.path = path
         self.file = None
+        self._pending_fsync = 0
+        self._last_fsync_mono = monotonic()
+        self._fsync_max_pending = METADATA_FSYNC_MAX_PENDING
 
     def __enter__(self) -> "_MetadataWriter":
+        if _env_bool(METADATA_FSYNC_EACH_RECORD_ENV, default=False):
+            self._fsync_max_pending = 1
         self.path.parent.mkdir(parents=True, exist_ok=True)
         _ensure_newline_terminated(self.path)
-        self.file = self.path.open("a", encoding="utf-8")
+        self.file = self.path.open("ab")
         return self
 
     def append(self, record: dict[str, object]) -> None:
         if self.file is None:
             raise RuntimeError("metadata writer is closed")
-        line = json.dumps(record, ensure_ascii=False)
-        self.file.write(line)
-        self.file.write("\n")
+        self.file.write(_dumps_jsonl_line(record))
         self.file.flush()
+        self._pending_fsync += 1
+        if (
+            self._pending_fsync >= self._fsync_max_pending
+            or monotonic() - self._last_fsync_mono >= METADATA_FSYNC_INTERVAL_S
+        ):
+            self._fsync()
+
+    def _fsync(self) -> None:
+        if self.file is None:
+            return
         os.fsync(self.file.fileno())
+        self._pending_fsync = 0
+        self._last_fsync_mono = monotonic()
 
     def __exit__(self, exc_type: object, exc: object, tb: object) -> None:
         if self.file is not None:
-            self.file.close()
-            self.file = None
+            try:
+                if self._pending_fsync:
+                    self._fsync()
+            finally:
+                self.file.close()
+                self.file = None
 
 
 def _metadata_writer(path: Path) -> _MetadataWriter:
@@ -1187,18 +1456,23 @@ def _metadata_writer(path: Path) -> _MetadataWriter:
 
 
 def _ensure_newline_terminated(path: Path) -> None:
-    if not path.exists() or path.stat().st_size == 0:
+    try:
+        size = path.stat().st_size
+    except FileNotFoundError:
+        return
+    if size == 0:
         return
 
-    with path.open("rb+") as file:
-        file.seek(-1, os.SEEK_END)
-        last_byte = file.read(1)
-        if last_byte == b"\n":
+    # 直接在 fd 上 lseek + 读 1 字节，免去 rb+ 的缓冲层；读完后偏移恰在文件尾，可直接补写换行
+    fd = os.open(path, os.O_RDWR | getattr(os, "O_BINARY", 0))
+    try:
+        os.lseek(fd, size - 1, os.SEEK_SET)
+        if os.read(fd, 1) == b"\n":
             return
-        file.seek(0, os.SEEK_END)
-        file.write(b"\n")
-        file.flush()
-        os.fsync(file.fileno())
+        os.write(fd, b"\n")
+        os.fsync(fd)
+    finally:
+        os.close(fd)
 
 
 def _effective_negative_prompt(
@@ -1256,12 +1530,24 @@ def _effective_generation_params(
     }
 
 
+def _project_x_fields(x_row: dict[str, str]) -> dict[str, str]:
+    return {
+        "gender": x_row.get("gender", ""),
+        "characters": x_row.get("characters", ""),
+        "series": x_row.get("series", ""),
+        "rating": x_row.get("rating", ""),
+        "general": x_row.get("general", ""),
+        "quality": x_row.get("quality", ""),
+    }
+
+
 def _build_base_metadata_record(
     *,
     status: str,
     x_index: int,
     y_index: int,
-    x_row: dict[str, str],
+    x_fields: dict[str, str],
+    x_info_type: str | None,
     y_value: str,
     positive_prompt: str,
     prompt_hash: str,
@@ -1273,15 +1559,8 @@ def _build_base_metadata_record(
         "status": status,
         "x_index": x_index,
         "y_index": y_index,
-        "x_fields": {
-            "gender": x_row.get("gender", ""),
-            "characters": x_row.get("characters", ""),
-            "series": x_row.get("series", ""),
-            "rating": x_row.get("rating", ""),
-            "general": x_row.get("general", ""),
-            "quality": x_row.get("quality", ""),
-        },
-        "x_info_type": _extract_x_info_type(x_row),
+        "x_fields": x_fields,
+        "x_info_type": x_info_type,
         "y_value": y_value,
         "positive_prompt": positive_prompt,
         "prompt_hash": prompt_hash,
@@ -1345,10 +1624,9 @@ def _worker_submit_and_wait(
     prompt_id: str | None = None
 
     try:
-        negative_prompt = _final_negative_prompt_for_x_row(
-            args,
-            workflow_context,
-            plan.x_row,
+        # 与写入 metadata 的 generation_params 同源：计划阶段已按 x 行算好（含追加部分）
+        negative_prompt = cast(
+            str | None, plan.generation_params.get("negative_prompt")
         )
         if negative_prompt is None:
             raise ValueError("无法确定负面提示词")
@@ -1372,7 +1650,9 @@ def _worker_submit_and_wait(
             save_image_prefix=plan.save_image_prefix,
         )
 
-        client_id = f"{args.client_id}-{uuid.uuid4().hex[:8]}"
+        client_id = (
+            f"{args.client_id}-{_CLIENT_ID_PREFIX}{next(_CLIENT_ID_COUNTER):08x}"
+        )
         prompt_id = comfy_submit_prompt(
             base_url=args.base_url,
             workflow=cast(dict[str, object], patched_workflow),
@@ -1404,7 +1684,8 @@ def _worker_submit_and_wait(
             status="failed",
             x_index=plan.x_index,
             y_index=plan.y_index,
-            x_row=plan.x_row,
+            x_fields=plan.x_fields,
+            x_info_type=plan.x_info_type,
             y_value=plan.y_value,
             positive_prompt=plan.positive_prompt,
             prompt_hash=plan.prompt_hash,
@@ -1425,11 +1706,13 @@ def _worker_fetch_and_download(
     args: argparse.Namespace,
     run_dir: Path,
     req: _DownloadRequest,
+    retry_budget: _RetryBudget,
 ) -> dict[str, object]:
     plan = req.plan
     prompt_id = req.prompt_id
     remote_images: list[dict[str, str]] | None = None
     local_image_paths: list[str] | None = None
+    error: dict[str, object] | None = None
 
     try:
         remote_images = _fetch_remote_images_with_retry(
@@ -1437,6 +1720,8 @@ def _worker_fetch_and_download(
             prompt_id=prompt_id,
             request_timeout_s=args.request_timeout_s,
             job_timeout_s=args.job_timeout_s,
+            max_attempts=retry_budget.history_max_attempts,
+            stop_after_delay_s=retry_budget.history_stop_after_delay_s,
         )
         if not remote_images:
             raise ValueError("history 未返回可下载图像")
@@ -1446,63 +1731,50 @@ def _worker_fetch_and_download(
             y_index=plan.y_index,
             remote_images=remote_images,
         )
-        for image, local_path in zip(remote_images, local_image_paths, strict=True):
-            _ = comfy_download_image_to_path(
-                base_url=args.base_url,
-                image=cast(dict[str, object], image),
-                output_path=run_dir / local_path,
-                request_timeout_s=args.request_timeout_s,
-            )
-
-        finished_at = _now_iso()
-        elapsed_ms = int((monotonic() - req.started_mono) * 1000)
-        record = _build_base_metadata_record(
-            status="success",
-            x_index=plan.x_index,
-            y_index=plan.y_index,
-            x_row=plan.x_row,
-            y_value=plan.y_value,
-            positive_prompt=plan.positive_prompt,
-            prompt_hash=plan.prompt_hash,
-            seed=plan.seed,
-            generation_params=plan.generation_params,
-            workflow_hash=plan.workflow_hash,
+        _ = comfy_download_images_to_paths(
+            base_url=args.base_url,
+            items=[
+                (cast(dict[str, object], image), run_dir / local_path)
+                for image, local_path in zip(
+                    remote_images, local_image_paths, strict=True
+                )
+            ],
+            request_timeout_s=args.request_timeout_s,
+            max_attempts=retry_budget.view_max_attempts,
+            stop_after_delay_s=retry_budget.view_stop_after_delay_s,
         )
-        record["x_description"] = plan.x_description
-        record["comfyui_prompt_id"] = prompt_id
-        record["remote_images"] = remote_images
-        record["local_image_paths"] = local_image_paths
-        record["local_image_path"] = local_image_paths[0] if local_image_paths else None
-        record["started_at"] = req.started_at
-        record["finished_at"] = finished_at
-        record["elapsed_ms"] = elapsed_ms
-        return record
+
     except Exception as exc:
         LOG.exception("下载失败: x=%s y=%s", plan.x_index, plan.y_index)
-        finished_at = _now_iso()
-        elapsed_ms = int((monotonic() - req.started_mono) * 1000)
-        record = _build_base_metadata_record(
-            status="failed",
-            x_index=plan.x_index,
-            y_index=plan.y_index,
-            x_row=plan.x_row,
-            y_value=plan.y_value,
-            positive_prompt=plan.positive_prompt,
-            prompt_hash=plan.prompt_hash,
-            seed=plan.seed,
-            generation_params=plan.generation_params,
-            workflow_hash=plan.workflow_hash,
-        )
-        record["x_description"] = plan.x_description
-        record["comfyui_prompt_id"] = prompt_id
-        record["remote_images"] = remote_images
-        record["local_image_paths"] = local_image_paths
-        record["local_image_path"] = local_image_paths[0] if local_image_paths else None
-        record["started_at"] = req.started_at
-        record["finished_at"] = finished_at
-        record["elapsed_ms"] = elapsed_ms
-        record["error"] = _serialize_error(exc)
-        return record
+        error = _serialize_error(exc)
+
+    # 成功与失败共用同一份记录构造，仅 status / error 不同
+    finished_at = _now_iso()
+    elapsed_ms = int((monotonic() - req.started_mono) * 1000)
+    record = _build_base_metadata_record(
+        status="success" if error is None else "failed",
+        x_index=plan.x_index,
+        y_index=plan.y_index,
+        x_fields=plan.x_fields,
+        x_info_type=plan.x_info_type,
+        y_value=plan.y_value,
+        positive_prompt=plan.positive_prompt,
+        prompt_hash=plan.prompt_hash,
+        seed=plan.seed,
+        generation_params=plan.generation_params,
+        workflow_hash=plan.workflow_hash,
+    )
+    record["x_description"] = plan.x_description
+    record["comfyui_prompt_id"] = prompt_id
+    record["remote_images"] = remote_images
+    record["local_image_paths"] = local_image_paths
+    record["local_image_path"] = local_image_paths[0] if local_image_paths else None
+    record["started_at"] = req.started_at
+    record["finished_at"] = finished_at
+    record["elapsed_ms"] = elapsed_ms
+    if error is not None:
+        record["error"] = error
+    return record
 
 
 def _fetch_remote_images_with_retry(
@@ -1511,13 +1783,18 @@ def _fetch_remote_images_with_retry(
     prompt_id: str,
     request_timeout_s: float,
     job_timeout_s: float,
+    max_attempts: int | None = None,
+    stop_after_delay_s: float | None = None,
 ) -> list[dict[str, str]]:
     deadline = monotonic() + min(10.0, max(1.0, job_timeout_s))
+    delay = HISTORY_POLL_INITIAL_DELAY_S
     while True:
         history_item = comfy_get_history_item(
             base_url=base_url,
             prompt_id=prompt_id,
             request_timeout_s=request_timeout_s,
+            max_attempts=max_attempts,
+            stop_after_delay_s=stop_after_delay_s,
         )
         images = _collect_remote_images(history_item)
         if images:
@@ -1525,7 +1802,8 @@ def _fetch_remote_images_with_retry(
 
         if monotonic() >= deadline:
             return []
-        sleep(0.25)
+        sleep(delay)
+        delay = min(delay * 2, HISTORY_POLL_MAX_DELAY_S)
 
 
 def _build_local_image_paths(
@@ -1554,17 +1832,35 @@ def _serialize_error(exc: Exception) -> dict[str, object]:
 
 
 def _sha256_file(path: Path) -> str:
-    digest = hashlib.sha256()
-    with path.open("rb") as file:
-        while True:
-            chunk = file.read(1024 * 1024)
-            if not chunk:
-                break
-            digest.update(chunk)
-    return digest.hexdigest()
+    # 菜单会在同一进程内多次调用 run()：按文件身份与 stat 复用已算过的摘要；
+    # inode / ctime 一并入键，原子替换或同尺寸改写在 mtime 粒度内也能失效
+    stat = path.stat()
+    return _sha256_file_cached(
+        str(path.resolve()),
+        stat.st_ino,
+        stat.st_size,
+        stat.st_mtime_ns,
+        stat.st_ctime_ns,
+    )
+
+
+@lru_cache(maxsize=32)
+def _sha256_file_cached(
+    resolved_path: str,
+    inode: int,
+    size: int,
+    mtime_ns: int,
+    ctime_ns: int,
+) -> str:
+    _ = (inode, size, mtime_ns, ctime_ns)
+    with open(resolved_path, "rb") as file:
+        return hashlib.file_digest(file, "sha256").hexdigest()
 
 
 def _coerce_int_or_none(value: object) -> int | None:
+    # JSON 解码出的值绝大多数就是精确的 int：一次 type 比较直接返回，跳过 isinstance 链
+    if type(value) is int:
+        return value
     if isinstance(value, bool):
         return None
     if isinstance(value, int):
@@ -1,9 +1,9 @@
 import hashlib
 import json
-import re
 from collections.abc import Mapping
+from functools import lru_cache
 from pathlib import Path
-from typing import cast
+from typing import Protocol, cast
 
 
 MAX_SEED = 18446744073709519872
@@ -20,6 +20,17 @@ PROMPT_TEMPLATE_ORDER = (
 )
 
 
+class Sha256Hasher(Protocol):
+    # hashlib 的哈希对象类型（_hashlib.HASH）没有公开名字，这里只描述用到的接口
+    def update(self, data: bytes, /) -> None: ...
+
+    def copy(self) -> "Sha256Hasher": ...
+
+    def digest(self) -> bytes: ...
+
+    def hexdigest(self) -> str: ...
+
+
 def _format_weight(weight: float) -> str:
     rendered = f"{weight:.3f}".rstrip("0").rstrip(".")
     return rendered or "0"
@@ -179,10 +190,10 @@ def render_positive_prompt(x_row: Mapping[str, str], y_value: str) -> str:
 
 
 def normalize_prompt(prompt: str) -> str:
-    normalized = prompt.strip()
-    normalized = re.sub(r"\s+", " ", normalized)
-    normalized = re.sub(r"\s*,\s*", ", ", normalized)
-    return normalized
+    # 等价于 strip + re.sub(r"\s+", " ") + re.sub(r"\s*,\s*", ", ")：
+    # split() 的空白定义与 \s 一致；折叠后逗号两侧至多一个空格，先剥掉再统一补成 ", "
+    collapsed = " ".join(prompt.split())
+    return collapsed.replace(" ,", ",").replace(", ", ",").replace(",", ", ")
 
 
 def compute_prompt_hash(prompt: str) -> str:
@@ -190,10 +201,17 @@ def compute_prompt_hash(prompt: str) -> str:
     return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
 
 
+@lru_cache(maxsize=8)
+def _seed_prefix_hasher(base_seed: int) -> Sha256Hasher:
+    return hashlib.sha256(f"{base_seed}:".encode())
+
+
 def derive_seed(base_seed: int, x_index: int, y_index: int) -> int:
-    raw = f"{base_seed}:{x_index}:{y_index}".encode("utf-8")
-    digest = hashlib.sha256(raw).hexdigest()
-    return int(digest[:16], 16) % MAX_SEED
+    # sha256 是流式的：复制已吸收 "base_seed:" 前缀的状态再补上 "x:y"，结果与整串哈希一致
+    hasher = _seed_prefix_hasher(base_seed).copy()
+    hasher.update(f"{x_index}:{y_index}".encode())
+    # 前 16 个十六进制字符即摘要前 8 字节（大端）
+    return int.from_bytes(hasher.digest()[:8], "big") % MAX_SEED
 
 
 def build_prompt_cell(
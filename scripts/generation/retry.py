@@ -1,3 +1,4 @@
+import math
 import random
 import time
 from collections.abc import Callable
@@ -14,11 +15,9 @@ def _compute_wait_with_full_jitter(
     max_delay_per_sleep_s: float,
     random_fn: Callable[[], float],
 ) -> float:
-    exponential_multiplier = 1.0
-    for _ in range(retry_index - 1):
-        exponential_multiplier *= 2.0
-    exponential_cap = base_delay_s * exponential_multiplier
-    cap = exponential_cap
+    # base * 2**(retry_index-1)；指数上限 62 足以越过任何 max_delay，且避免 ldexp 溢出
+    exponent = min(max(retry_index - 1, 0), 62)
+    cap = math.ldexp(base_delay_s, exponent)
     if cap > max_delay_per_sleep_s:
         cap = max_delay_per_sleep_s
     ratio = float(random_fn())
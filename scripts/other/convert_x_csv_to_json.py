@@ -2,7 +2,6 @@ from __future__ import annotations
 
 import argparse
 import csv
-import json
 import sys
 from pathlib import Path
 
@@ -11,7 +10,11 @@ ROOT_DIR = Path(__file__).resolve().parents[2]
 if str(ROOT_DIR) not in sys.path:
     sys.path.insert(0, str(ROOT_DIR))
 
-from scripts.other.convert_y_csv_to_json import parse_weighted_tags  # noqa: E402
+from scripts.other.convert_y_csv_to_json import (  # noqa: E402
+    CSV_READ_BUFFER_BYTES,
+    parse_weighted_tags,
+    write_json_atomic,
+)
 
 
 X_COLUMN_MAPPING: dict[str, str] = {
@@ -36,24 +39,42 @@ def convert_csv_to_json(
     item_type: str,
 ) -> int:
     items: list[dict[str, object]] = []
-    with csv_path.open("r", encoding="utf-8", newline="") as file:
-        reader = csv.DictReader(file)
-        for i, row in enumerate(reader):
-            tags: dict[str, list[dict[str, object]]] = {}
-            for source_col, key in X_COLUMN_MAPPING.items():
-                raw_value = row.get(source_col, "")
-                value = "" if raw_value is None else raw_value
-                tags[key] = parse_weighted_tags(value)
-
-            raw_type = row.get(TYPE_COLUMN, "")
-            type_value = "" if raw_type is None else raw_type.strip()
+    with csv_path.open(
+        "r", encoding="utf-8", newline="", buffering=CSV_READ_BUFFER_BYTES
+    ) as file:
+        # 用 csv.reader + 表头列号代替 DictReader，避免每行构造 dict；
+        # 重名列取最后一列、缺失列与短行视为空串，与 DictReader 行为一致
+        reader = csv.reader(file)
+        header = next(reader, None)
+        column_positions = (
+            {name: pos for pos, name in enumerate(header)} if header else {}
+        )
+        tag_positions = [
+            (key, column_positions.get(source_col))
+            for source_col, key in X_COLUMN_MAPPING.items()
+        ]
+        type_pos = column_positions.get(TYPE_COLUMN)
+        desc_zh_pos = column_positions.get(DESCRIPTION_ZH_COLUMN)
+        desc_en_pos = column_positions.get(DESCRIPTION_EN_COLUMN)
+
+        def cell(row: list[str], pos: int | None) -> str:
+            if pos is None or pos >= len(row):
+                return ""
+            return row[pos]
+
+        i = 0
+        for row in reader:
+            if not row:
+                continue
+            tags: dict[str, list[dict[str, object]]] = {
+                key: parse_weighted_tags(cell(row, pos)) for key, pos in tag_positions
+            }
+
+            type_value = cell(row, type_pos).strip()
             info_type = type_value if type_value else item_type
 
-            raw_desc_zh = row.get(DESCRIPTION_ZH_COLUMN, "")
-            desc_zh = "" if raw_desc_zh is None else raw_desc_zh.strip()
-
-            raw_desc_en = row.get(DESCRIPTION_EN_COLUMN, "")
-            desc_en = "" if raw_desc_en is None else raw_desc_en.strip()
+            desc_zh = cell(row, desc_zh_pos).strip()
+            desc_en = cell(row, desc_en_pos).strip()
 
             items.append(
                 {
@@ -62,12 +83,10 @@ def convert_csv_to_json(
                     "description": {"zh": desc_zh, "en": desc_en},
                 }
             )
+            i += 1
 
     payload = {"schema": schema, "items": items}
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    out_path.write_text(
-        json.dumps(payload, ensure_ascii=False, indent=2) + "\n", encoding="utf-8"
-    )
+    write_json_atomic(out_path, payload)
     return len(items)
 
 
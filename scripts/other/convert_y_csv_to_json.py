@@ -4,20 +4,18 @@ import argparse
 import csv
 import json
 import math
+import os
+import re
+import tempfile
 from pathlib import Path
 
 
 UP_BASE = 1.1
 DOWN_BASE = 0.9
-
-
-def _is_escaped(text: str, pos: int) -> bool:
-    backslashes = 0
-    i = pos - 1
-    while i >= 0 and text[i] == "\\":
-        backslashes += 1
-        i -= 1
-    return (backslashes % 2) == 1
+# CSV 读取缓冲：大表按 1 MiB 成块读，减少 read() 系统调用次数
+CSV_READ_BUFFER_BYTES = 1 << 20
+# 未被转义的分隔符：前面的反斜杠为偶数个（含 0 个）；反斜杠本身留在 token 文本里
+_TAG_DELIMITER_RE = re.compile(r"(?<!\\)(?:\\\\)*([,，()\[\]])")
 
 
 def _depth_weight(base: float, depth: int) -> float:
@@ -26,8 +24,24 @@ def _depth_weight(base: float, depth: int) -> float:
     return math.pow(base, depth)
 
 
+# 常见嵌套深度的权重预先算好，flush 时查表；更深的嵌套回退到 math.pow
+_WEIGHT_TABLE_DEPTH = 32
+_UP_WEIGHTS = tuple(_depth_weight(UP_BASE, d) for d in range(_WEIGHT_TABLE_DEPTH))
+_DOWN_WEIGHTS = tuple(_depth_weight(DOWN_BASE, d) for d in range(_WEIGHT_TABLE_DEPTH))
+
+
 def _current_weight(paren_depth: int, bracket_depth: int) -> float:
-    return _depth_weight(UP_BASE, paren_depth) * _depth_weight(DOWN_BASE, bracket_depth)
+    up = (
+        _UP_WEIGHTS[paren_depth]
+        if paren_depth < _WEIGHT_TABLE_DEPTH
+        else _depth_weight(UP_BASE, paren_depth)
+    )
+    down = (
+        _DOWN_WEIGHTS[bracket_depth]
+        if bracket_depth < _WEIGHT_TABLE_DEPTH
+        else _depth_weight(DOWN_BASE, bracket_depth)
+    )
+    return up * down
 
 
 def parse_weighted_tags(prompt: str) -> list[dict[str, object]]:
@@ -36,53 +50,68 @@ def parse_weighted_tags(prompt: str) -> list[dict[str, object]]:
         return []
 
     items: list[dict[str, object]] = []
-    buf: list[str] = []
     paren_depth = 0
     bracket_depth = 0
-
-    def flush() -> None:
-        token = "".join(buf).strip()
-        buf.clear()
-        if not token:
-            return
-        weight = round(_current_weight(paren_depth, bracket_depth), 3)
-        items.append({"text": token, "weight": weight})
-
-    for i, ch in enumerate(text):
-        if (ch == "," or ch == "，") and not _is_escaped(text, i):
-            flush()
+    weight = 1.0
+    start = 0
+    # 无匹配的 ")" / "]" 会被丢弃但不切分 token，先把两侧文本攒在这里
+    pending = ""
+
+    for match in _TAG_DELIMITER_RE.finditer(text):
+        ch = match.group(1)
+        end = match.start(1)
+        if (ch == ")" and paren_depth == 0) or (ch == "]" and bracket_depth == 0):
+            pending += text[start:end]
+            start = match.end()
             continue
 
-        if ch == "(" and not _is_escaped(text, i):
-            flush()
-            paren_depth += 1
-            continue
-
-        if ch == ")" and not _is_escaped(text, i):
-            if paren_depth > 0:
-                flush()
-                paren_depth -= 1
-            else:
-                pass
-            continue
+        token = (pending + text[start:end]).strip()
+        pending = ""
+        start = match.end()
+        if token:
+            items.append({"text": token, "weight": weight})
 
-        if ch == "[" and not _is_escaped(text, i):
-            flush()
+        if ch == "(":
+            paren_depth += 1
+        elif ch == ")":
+            paren_depth -= 1
+        elif ch == "[":
             bracket_depth += 1
+        elif ch == "]":
+            bracket_depth -= 1
+        else:
             continue
+        # 权重只随嵌套深度变化
+        weight = round(_current_weight(paren_depth, bracket_depth), 3)
 
-        if ch == "]" and not _is_escaped(text, i):
-            if bracket_depth > 0:
-                flush()
-                bracket_depth -= 1
-            else:
-                pass
-            continue
+    token = (pending + text[start:]).strip()
+    if token:
+        items.append({"text": token, "weight": weight})
+    return items
 
-        buf.append(ch)
 
-    flush()
-    return items
+def write_json_atomic(out_path: Path, payload: object) -> None:
+    # 先写同目录临时文件再 os.replace，中断时不会留下半截 JSON 覆盖旧资产；
+    # json.dump 直接流式写入文件，不再先拼出整份字符串
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path: Path | None = None
+    try:
+        with tempfile.NamedTemporaryFile(
+            mode="w",
+            encoding="utf-8",
+            dir=str(out_path.parent),
+            prefix=f".{out_path.name}.",
+            suffix=".tmp",
+            delete=False,
+        ) as temp_file:
+            temp_path = Path(temp_file.name)
+            json.dump(payload, temp_file, ensure_ascii=False, indent=2)
+            temp_file.write("\n")
+        os.replace(temp_path, out_path)
+        temp_path = None
+    finally:
+        if temp_path is not None:
+            temp_path.unlink(missing_ok=True)
 
 
 def convert_csv_to_json(
@@ -96,10 +125,27 @@ def convert_csv_to_json(
 ) -> int:
     items: list[dict[str, object]] = []
 
-    with csv_path.open("r", encoding="utf-8", newline="") as file:
-        reader = csv.DictReader(file)
+    with csv_path.open(
+        "r", encoding="utf-8", newline="", buffering=CSV_READ_BUFFER_BYTES
+    ) as file:
+        # 与 convert_x 相同：csv.reader + 表头列号代替 DictReader；
+        # 重名列取最后一列、空行跳过、短行缺失的列按缺失处理，与 DictReader 行为一致
+        reader = csv.reader(file)
+        header = next(reader, None)
+        column_positions = (
+            {name: pos for pos, name in enumerate(header)} if header else {}
+        )
+        index_pos = column_positions.get(index_column)
+        tags_pos = column_positions.get(tags_column)
+
         for row in reader:
-            index_raw = row.get(index_column)
+            if not row:
+                continue
+            index_raw = (
+                row[index_pos]
+                if index_pos is not None and index_pos < len(row)
+                else None
+            )
             if index_raw is None:
                 raise ValueError(
                     f"Missing column {index_column!r} in {csv_path.as_posix()}"
@@ -111,8 +157,9 @@ def convert_csv_to_json(
                 )
             index = int(index_str)
 
-            tags_raw = row.get(tags_column, "")
-            tags_str = "" if tags_raw is None else tags_raw
+            tags_str = (
+                row[tags_pos] if tags_pos is not None and tags_pos < len(row) else ""
+            )
             tags = parse_weighted_tags(tags_str)
 
             items.append(
@@ -123,10 +170,7 @@ def convert_csv_to_json(
             )
 
     payload = {"schema": schema, "items": items}
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    out_path.write_text(
-        json.dumps(payload, ensure_ascii=False, indent=2) + "\n", encoding="utf-8"
-    )
+    write_json_atomic(out_path, payload)
     return len(items)
 
 
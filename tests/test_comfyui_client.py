@@ -1,14 +1,18 @@
 # pyright: reportMissingImports=false, reportUnknownVariableType=false, reportUnknownMemberType=false, reportUnknownArgumentType=false
 
 import json
+import socket
 import sys
+import threading
+import time
 from collections.abc import Iterator
 from pathlib import Path
 from typing import cast
+from urllib.parse import parse_qs, urlparse
 
 import pytest
 import requests
-from websocket import WebSocketTimeoutException
+from websocket import ABNF, WebSocketTimeoutException
 
 ROOT = Path(__file__).resolve().parents[1]
 sys.path.insert(0, str(ROOT))
@@ -29,9 +33,14 @@ class MockResponse:
         status_code: int = 200,
     ) -> None:
         self._json_data = json_data
+        if json_data is not None and not content:
+            content = json.dumps(json_data).encode("utf-8")
         self.content = content
         self.status_code = status_code
 
+    def close(self) -> None:
+        return None
+
     def json(self) -> object:
         if self._json_data is None:
             raise ValueError("no json")
@@ -81,13 +90,15 @@ class FakeWebSocket:
     def settimeout(self, timeout: float) -> None:
         self.timeout = timeout
 
-    def recv(self) -> object:
+    def recv_data(self) -> tuple[int, bytes]:
         if not self._messages:
             raise WebSocketTimeoutException("read timeout")
         item = self._messages.pop(0)
         if isinstance(item, BaseException):
             raise item
-        return item
+        if isinstance(item, str):
+            return ABNF.OPCODE_TEXT, item.encode("utf-8")
+        return ABNF.OPCODE_BINARY, cast(bytes, item)
 
     def close(self) -> None:
         self.closed = True
@@ -134,7 +145,7 @@ def test_comfy_submit_prompt_accepts_prompt_id_and_promptId(
         captured["timeout"] = timeout
         return MockResponse(json_data={id_key: "p-123"})
 
-    monkeypatch.setattr("scripts.generation.comfyui_client.requests.post", fake_post)
+    monkeypatch.setattr("scripts.generation.comfyui_client._SESSION.post", fake_post)
 
     prompt_id = comfy.comfy_submit_prompt(
         base_url="http://127.0.0.1:8188/",
@@ -152,6 +163,25 @@ def test_comfy_submit_prompt_accepts_prompt_id_and_promptId(
     }
 
 
+def test_comfy_submit_prompt_raises_structured_error_on_invalid_json(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    def fake_post(url: str, json: object, timeout: float) -> MockResponse:  # noqa: A002
+        _ = (url, json, timeout)
+        return MockResponse(content=b"<html>bad gateway</html>")
+
+    monkeypatch.setattr("scripts.generation.comfyui_client._SESSION.post", fake_post)
+
+    with pytest.raises(comfy.ComfyUIClientError) as exc:
+        _ = comfy.comfy_submit_prompt(
+            base_url="http://127.0.0.1:8188",
+            workflow={"1": {}},
+            client_id="cid",
+        )
+
+    assert exc.value.code == "invalid_json_response"
+
+
 def test_comfy_submit_prompt_raises_structured_error_when_prompt_id_missing(
     monkeypatch: pytest.MonkeyPatch,
 ) -> None:
@@ -159,7 +189,7 @@ def test_comfy_submit_prompt_raises_structured_error_when_prompt_id_missing(
         _ = (url, json, timeout)
         return MockResponse(json_data={"status": "ok"})
 
-    monkeypatch.setattr("scripts.generation.comfyui_client.requests.post", fake_post)
+    monkeypatch.setattr("scripts.generation.comfyui_client._SESSION.post", fake_post)
 
     with pytest.raises(comfy.ComfyUIClientError) as exc:
         _ = comfy.comfy_submit_prompt(
@@ -180,9 +210,16 @@ def test_comfy_ws_connect_uses_clientId_query_and_preserves_base_path(
     captured: dict[str, object] = {}
     fake_ws = FakeWebSocket([])
 
-    def fake_create_connection(url: str, timeout: float) -> FakeWebSocket:
+    def fake_create_connection(
+        url: str,
+        timeout: float,
+        sockopt: object = (),
+        skip_utf8_validation: bool = False,
+    ) -> FakeWebSocket:
         captured["url"] = url
         captured["timeout"] = timeout
+        captured["sockopt"] = sockopt
+        captured["skip_utf8_validation"] = skip_utf8_validation
         return fake_ws
 
     monkeypatch.setattr(
@@ -200,6 +237,8 @@ def test_comfy_ws_connect_uses_clientId_query_and_preserves_base_path(
     assert captured["url"] == "wss://demo.local/comfy/api/ws?clientId=client%2042"
     assert captured["timeout"] == 12.5
     assert fake_ws.timeout == 12.5
+    assert captured["skip_utf8_validation"] is True
+    assert (socket.IPPROTO_TCP, socket.TCP_NODELAY, 1) in captured["sockopt"]
 
 
 def test_comfy_ws_wait_prompt_done_supports_executing_done_and_ignores_noise() -> None:
@@ -238,6 +277,46 @@ def test_comfy_ws_wait_prompt_done_supports_executing_done_and_ignores_noise() -
     assert ws.timeout == 0.25
 
 
+def test_comfy_ws_wait_prompt_done_skips_parsing_non_terminal_frames(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    parsed: list[str | bytes] = []
+    real_loads = json.loads
+
+    def counting_loads(frame: str | bytes) -> object:
+        parsed.append(frame)
+        return real_loads(frame)
+
+    monkeypatch.setattr(comfy.json, "loads", counting_loads)
+    done_frame = json.dumps(
+        {"type": "executing", "data": {"prompt_id": "p-123", "node": None}}
+    )
+    ws = FakeWebSocket(
+        messages=[
+            json.dumps({"type": "execution_start", "data": {"prompt_id": "p-123"}}),
+            json.dumps(
+                {
+                    "type": "execution_cached",
+                    "data": {"prompt_id": "p-123", "nodes": ["1"]},
+                }
+            ),
+            json.dumps(
+                {"type": "progress", "data": {"prompt_id": "p-123", "value": 1}}
+            ),
+            done_frame,
+        ]
+    )
+
+    comfy.comfy_ws_wait_prompt_done(
+        ws=ws,
+        prompt_id="p-123",
+        request_timeout_s=0.25,
+        job_timeout_s=3.0,
+    )
+
+    assert parsed == [done_frame.encode("utf-8")]
+
+
 def test_comfy_ws_wait_prompt_done_supports_execution_success_fallback() -> None:
     ws = FakeWebSocket(
         messages=[
@@ -379,6 +458,36 @@ def test_comfy_ws_wait_prompt_done_retries_request_timeout_until_job_timeout(
     assert "job" in message.lower()
 
 
+def test_comfy_ws_wait_prompt_done_shrinks_recv_timeout_near_deadline(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    timeouts: list[float] = []
+
+    class RecordingWebSocket(FakeWebSocket):
+        def settimeout(self, timeout: float) -> None:
+            super().settimeout(timeout)
+            timeouts.append(timeout)
+
+    ws = RecordingWebSocket(
+        messages=[
+            WebSocketTimeoutException("read timeout"),
+            WebSocketTimeoutException("read timeout"),
+        ]
+    )
+    clock = ControlledClock([0.0, 0.0, 9.0, 10.5])
+    monkeypatch.setattr("scripts.generation.comfyui_client.time.monotonic", clock)
+
+    with pytest.raises(comfy.ComfyUIJobTimeoutError):
+        comfy.comfy_ws_wait_prompt_done(
+            ws=ws,
+            prompt_id="p-deadline",
+            request_timeout_s=5.0,
+            job_timeout_s=10.0,
+        )
+
+    assert timeouts == [5.0, pytest.approx(1.0)]
+
+
 def test_wait_prompt_done_with_fallback_recovers_from_ws_receive_failure(
     monkeypatch: pytest.MonkeyPatch,
 ) -> None:
@@ -398,7 +507,10 @@ def test_wait_prompt_done_with_fallback_recovers_from_ws_receive_failure(
         return "unexpected"
 
     def fake_get(
-        url: str, timeout: float, params: object | None = None
+        url: str,
+        timeout: float,
+        params: object | None = None,
+        stream: bool = False,
     ) -> MockResponse:
         nonlocal attempts
         attempts += 1
@@ -411,7 +523,7 @@ def test_wait_prompt_done_with_fallback_recovers_from_ws_receive_failure(
 
     monkeypatch.setattr(comfy, "comfy_submit_prompt", fake_submit_prompt)
     monkeypatch.setattr(comfy, "comfy_ws_connect", fake_ws_connect)
-    monkeypatch.setattr("scripts.generation.comfyui_client.requests.get", fake_get)
+    monkeypatch.setattr("scripts.generation.comfyui_client._SESSION.get", fake_get)
     monkeypatch.setattr(
         "scripts.generation.comfyui_client.time.monotonic", clock.monotonic
     )
@@ -440,7 +552,10 @@ def test_wait_prompt_done_with_fallback_recovers_from_ws_connect_failure(
     clock = MutableClock(now=0.0)
 
     def fake_get(
-        url: str, timeout: float, params: object | None = None
+        url: str,
+        timeout: float,
+        params: object | None = None,
+        stream: bool = False,
     ) -> MockResponse:
         nonlocal attempts
         attempts += 1
@@ -456,7 +571,7 @@ def test_wait_prompt_done_with_fallback_recovers_from_ws_connect_failure(
         )
 
     monkeypatch.setattr(comfy, "comfy_ws_connect", fake_ws_connect)
-    monkeypatch.setattr("scripts.generation.comfyui_client.requests.get", fake_get)
+    monkeypatch.setattr("scripts.generation.comfyui_client._SESSION.get", fake_get)
     monkeypatch.setattr(
         "scripts.generation.comfyui_client.time.monotonic", clock.monotonic
     )
@@ -473,6 +588,20 @@ def test_wait_prompt_done_with_fallback_recovers_from_ws_connect_failure(
     assert attempts == 2
 
 
+def test_history_fallback_poll_delay_backs_off_with_jitter_up_to_cap() -> None:
+    low = [comfy._history_fallback_poll_delay(i, lambda: 0.0) for i in range(8)]
+    high = [comfy._history_fallback_poll_delay(i, lambda: 1.0) for i in range(8)]
+
+    assert low[0] == pytest.approx(comfy.HISTORY_FALLBACK_POLL_BASE_S * 0.5)
+    assert high[0] == pytest.approx(comfy.HISTORY_FALLBACK_POLL_BASE_S)
+    assert high[1] == pytest.approx(comfy.HISTORY_FALLBACK_POLL_BASE_S * 2)
+    assert low == sorted(low)
+    assert max(high) == pytest.approx(comfy.HISTORY_FALLBACK_POLL_CAP_S)
+    assert comfy._history_fallback_poll_delay(10_000, lambda: 1.0) == pytest.approx(
+        comfy.HISTORY_FALLBACK_POLL_CAP_S
+    )
+
+
 def test_wait_prompt_done_with_fallback_raises_job_timeout_when_history_never_ready(
     monkeypatch: pytest.MonkeyPatch,
 ) -> None:
@@ -480,7 +609,10 @@ def test_wait_prompt_done_with_fallback_raises_job_timeout_when_history_never_re
     clock = MutableClock(now=0.0)
 
     def fake_get(
-        url: str, timeout: float, params: object | None = None
+        url: str,
+        timeout: float,
+        params: object | None = None,
+        stream: bool = False,
     ) -> MockResponse:
         nonlocal attempts
         attempts += 1
@@ -497,7 +629,7 @@ def test_wait_prompt_done_with_fallback_raises_job_timeout_when_history_never_re
         )
 
     monkeypatch.setattr(comfy, "comfy_ws_connect", fake_ws_connect)
-    monkeypatch.setattr("scripts.generation.comfyui_client.requests.get", fake_get)
+    monkeypatch.setattr("scripts.generation.comfyui_client._SESSION.get", fake_get)
     monkeypatch.setattr(
         "scripts.generation.comfyui_client.time.monotonic", clock.monotonic
     )
@@ -530,14 +662,17 @@ def test_comfy_get_history_item_supports_response_compatibility(
     captured: dict[str, object] = {}
 
     def fake_get(
-        url: str, timeout: float, params: object | None = None
+        url: str,
+        timeout: float,
+        params: object | None = None,
+        stream: bool = False,
     ) -> MockResponse:
         captured["url"] = url
         captured["timeout"] = timeout
         captured["params"] = params
         return MockResponse(json_data=history_payload)
 
-    monkeypatch.setattr("scripts.generation.comfyui_client.requests.get", fake_get)
+    monkeypatch.setattr("scripts.generation.comfyui_client._SESSION.get", fake_get)
 
     item = comfy.comfy_get_history_item(
         base_url="http://127.0.0.1:8188/",
@@ -557,7 +692,10 @@ def test_comfy_get_history_item_retries_transient_http_status_and_succeeds(
     attempts = 0
 
     def fake_get(
-        url: str, timeout: float, params: object | None = None
+        url: str,
+        timeout: float,
+        params: object | None = None,
+        stream: bool = False,
     ) -> MockResponse:
         nonlocal attempts
         attempts += 1
@@ -566,7 +704,7 @@ def test_comfy_get_history_item_retries_transient_http_status_and_succeeds(
             return MockResponse(status_code=503)
         return MockResponse(json_data={"p-1": {"outputs": {}}})
 
-    monkeypatch.setattr("scripts.generation.comfyui_client.requests.get", fake_get)
+    monkeypatch.setattr("scripts.generation.comfyui_client._SESSION.get", fake_get)
     monkeypatch.setattr("scripts.generation.retry.random.random", lambda: 0.0)
 
     item = comfy.comfy_get_history_item(
@@ -585,7 +723,10 @@ def test_comfy_get_history_item_retries_connection_error_and_succeeds(
     attempts = 0
 
     def fake_get(
-        url: str, timeout: float, params: object | None = None
+        url: str,
+        timeout: float,
+        params: object | None = None,
+        stream: bool = False,
     ) -> MockResponse:
         nonlocal attempts
         attempts += 1
@@ -594,7 +735,7 @@ def test_comfy_get_history_item_retries_connection_error_and_succeeds(
             raise requests.ConnectionError("connection dropped")
         return MockResponse(json_data={"outputs": {"10": {}}})
 
-    monkeypatch.setattr("scripts.generation.comfyui_client.requests.get", fake_get)
+    monkeypatch.setattr("scripts.generation.comfyui_client._SESSION.get", fake_get)
     monkeypatch.setattr("scripts.generation.retry.random.random", lambda: 0.0)
 
     item = comfy.comfy_get_history_item(
@@ -612,14 +753,17 @@ def test_comfy_get_history_item_does_not_retry_http_404(
     attempts = 0
 
     def fake_get(
-        url: str, timeout: float, params: object | None = None
+        url: str,
+        timeout: float,
+        params: object | None = None,
+        stream: bool = False,
     ) -> MockResponse:
         nonlocal attempts
         attempts += 1
         _ = (url, timeout, params)
         return MockResponse(status_code=404)
 
-    monkeypatch.setattr("scripts.generation.comfyui_client.requests.get", fake_get)
+    monkeypatch.setattr("scripts.generation.comfyui_client._SESSION.get", fake_get)
     monkeypatch.setattr("scripts.generation.retry.random.random", lambda: 0.0)
 
     with pytest.raises(comfy.ComfyUIRequestError) as exc:
@@ -640,14 +784,17 @@ def test_comfy_get_history_item_transient_retry_stops_after_total_budget(
     clock = MutableClock(now=0.0)
 
     def fake_get(
-        url: str, timeout: float, params: object | None = None
+        url: str,
+        timeout: float,
+        params: object | None = None,
+        stream: bool = False,
     ) -> MockResponse:
         nonlocal attempts
         attempts += 1
         _ = (url, timeout, params)
         raise requests.Timeout("read timeout")
 
-    monkeypatch.setattr("scripts.generation.comfyui_client.requests.get", fake_get)
+    monkeypatch.setattr("scripts.generation.comfyui_client._SESSION.get", fake_get)
     monkeypatch.setattr(comfy, "HISTORY_GET_RETRY_MAX_ATTEMPTS", 99)
     monkeypatch.setattr(comfy, "HISTORY_GET_RETRY_STOP_AFTER_DELAY_S", 0.3)
     monkeypatch.setattr("scripts.generation.retry.time.monotonic", clock.monotonic)
@@ -666,6 +813,35 @@ def test_comfy_get_history_item_transient_retry_stops_after_total_budget(
     assert exc.value.context["url"] == "http://127.0.0.1:8188/history/p-budget"
 
 
+def test_comfy_get_history_item_retry_budget_can_be_overridden_by_params(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    attempts = 0
+
+    def fake_get(
+        url: str,
+        timeout: float,
+        params: object | None = None,
+        stream: bool = False,
+    ) -> MockResponse:
+        nonlocal attempts
+        attempts += 1
+        _ = (url, timeout, params, stream)
+        raise requests.Timeout("read timeout")
+
+    monkeypatch.setattr("scripts.generation.comfyui_client._SESSION.get", fake_get)
+    monkeypatch.setattr("scripts.generation.retry.time.sleep", lambda _s: None)
+
+    with pytest.raises(comfy.ComfyUITransientRequestError):
+        _ = comfy.comfy_get_history_item(
+            base_url="http://127.0.0.1:8188",
+            prompt_id="p-override",
+            max_attempts=2,
+        )
+
+    assert attempts == 2
+
+
 def test_comfy_build_view_params_defaults_type_and_validates_filename() -> None:
     params = comfy.comfy_build_view_params(
         {"filename": "img.png", "subfolder": "foo/bar"}
@@ -692,7 +868,7 @@ def test_comfy_download_image_bytes_calls_view_endpoint_with_query_params(
         captured["params"] = params
         return MockResponse(content=b"PNGDATA")
 
-    monkeypatch.setattr("scripts.generation.comfyui_client.requests.get", fake_get)
+    monkeypatch.setattr("scripts.generation.comfyui_client._SESSION.get", fake_get)
 
     image_bytes = comfy.comfy_download_image_bytes(
         base_url="http://127.0.0.1:8188",
@@ -719,10 +895,12 @@ def test_comfy_download_image_to_path_saves_downloaded_bytes(
         params: dict[str, str],
         stream: bool = False,
     ) -> MockResponse:
-        _ = (url, timeout, params, stream)
+        _ = (timeout, stream)
+        captured.append((url, params))
         return MockStreamResponse(chunks=[b"image-bytes"])
 
-    monkeypatch.setattr("scripts.generation.comfyui_client.requests.get", fake_get)
+    captured: list[tuple[str, object]] = []
+    monkeypatch.setattr("scripts.generation.comfyui_client._SESSION.get", fake_get)
 
     output_path = tmp_path / "out.png"
     saved_path = comfy.comfy_download_image_to_path(
@@ -734,6 +912,136 @@ def test_comfy_download_image_to_path_saves_downloaded_bytes(
 
     assert saved_path == output_path
     assert output_path.read_bytes() == b"image-bytes"
+    assert captured == [("http://127.0.0.1:8188/view?filename=x.png&type=output", None)]
+
+
+@pytest.mark.parametrize(("env_value", "expected_calls"), [(None, 0), ("1", 1)])
+def test_comfy_download_image_to_path_fsync_is_opt_in(
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: Path,
+    env_value: str | None,
+    expected_calls: int,
+) -> None:
+    fsync_calls: list[int] = []
+
+    def fake_get(
+        url: str,
+        timeout: float,
+        params: dict[str, str],
+        stream: bool = False,
+    ) -> MockResponse:
+        _ = (url, timeout, params, stream)
+        return MockStreamResponse(chunks=[b"image-bytes"])
+
+    monkeypatch.setattr("scripts.generation.comfyui_client._SESSION.get", fake_get)
+    monkeypatch.setattr(
+        "scripts.generation.comfyui_client.os.fsync", fsync_calls.append
+    )
+    if env_value is None:
+        monkeypatch.delenv(comfy.DOWNLOAD_FSYNC_ENV, raising=False)
+    else:
+        monkeypatch.setenv(comfy.DOWNLOAD_FSYNC_ENV, env_value)
+
+    output_path = tmp_path / "out.png"
+    _ = comfy.comfy_download_image_to_path(
+        base_url="http://127.0.0.1:8188",
+        image={"filename": "x.png"},
+        output_path=output_path,
+    )
+
+    assert output_path.read_bytes() == b"image-bytes"
+    assert len(fsync_calls) == expected_calls
+
+
+def test_comfy_download_images_to_paths_downloads_all_in_input_order(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    lock = threading.Lock()
+    active = 0
+    peak = 0
+
+    def fake_get(
+        url: str,
+        timeout: float,
+        params: dict[str, str],
+        stream: bool = False,
+    ) -> MockResponse:
+        nonlocal active, peak
+        _ = (timeout, params, stream)
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        time.sleep(0.01)
+        with lock:
+            active -= 1
+        filename = parse_qs(urlparse(url).query)["filename"][0]
+        return MockStreamResponse(chunks=[filename.encode("utf-8")])
+
+    monkeypatch.setattr("scripts.generation.comfyui_client._SESSION.get", fake_get)
+
+    items: list[tuple[dict[str, object], str | Path]] = [
+        ({"filename": f"img-{index}.png"}, tmp_path / f"out-{index}.png")
+        for index in range(5)
+    ]
+    saved_paths = comfy.comfy_download_images_to_paths(
+        base_url="http://127.0.0.1:8188",
+        items=items,
+        max_workers=3,
+    )
+
+    assert saved_paths == [tmp_path / f"out-{index}.png" for index in range(5)]
+    assert peak <= 3
+    for index, saved_path in enumerate(saved_paths):
+        assert saved_path.read_bytes() == f"img-{index}.png".encode("utf-8")
+
+
+def test_comfy_download_images_to_paths_cancels_pending_and_drains_inflight_on_failure(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    second_started = threading.Event()
+    lock = threading.Lock()
+    started: list[str] = []
+    finished: list[str] = []
+
+    def fake_download(
+        base_url: str,
+        image: dict[str, object],
+        output_path: str | Path,
+        request_timeout_s: float = 30.0,
+        **_retry_kwargs: object,
+    ) -> Path:
+        _ = (base_url, request_timeout_s)
+        filename = str(image["filename"])
+        with lock:
+            started.append(filename)
+        if filename == "img-0.png":
+            second_started.wait(timeout=5.0)
+            raise comfy.ComfyUIClientError("boom", code="view_failed")
+        if filename == "img-1.png":
+            second_started.set()
+        # 失败发生时仍在下载：必须等它收尾后才抛出
+        time.sleep(0.05)
+        with lock:
+            finished.append(filename)
+        return Path(output_path)
+
+    monkeypatch.setattr(comfy, "comfy_download_image_to_path", fake_download)
+    count = 8
+    items: list[tuple[dict[str, object], str | Path]] = [
+        ({"filename": f"img-{index}.png"}, tmp_path / f"out-{index}.png")
+        for index in range(count)
+    ]
+
+    with pytest.raises(comfy.ComfyUIClientError, match="boom"):
+        comfy.comfy_download_images_to_paths(
+            base_url="http://127.0.0.1:8188", items=items, max_workers=2
+        )
+
+    with lock:
+        assert "img-1.png" in finished
+        # 抛出时所有已开始的下载都已完成，排队中的下载已被取消
+        assert sorted(finished) == sorted(set(started) - {"img-0.png"})
+        assert len(started) < count
 
 
 def test_view_download_retries_404_and_then_succeeds(
@@ -754,7 +1062,7 @@ def test_view_download_retries_404_and_then_succeeds(
             return MockResponse(status_code=404)
         return MockStreamResponse(chunks=[b"hello", b"-", b"world"])
 
-    monkeypatch.setattr("scripts.generation.comfyui_client.requests.get", fake_get)
+    monkeypatch.setattr("scripts.generation.comfyui_client._SESSION.get", fake_get)
     monkeypatch.setattr("scripts.generation.retry.random.random", lambda: 0.0)
 
     output_path = tmp_path / "view-404-retry.png"
@@ -785,7 +1093,7 @@ def test_view_download_stream_interrupted_cleans_temp_and_target(
             iter_error=requests.exceptions.ChunkedEncodingError("stream broken"),
         )
 
-    monkeypatch.setattr("scripts.generation.comfyui_client.requests.get", fake_get)
+    monkeypatch.setattr("scripts.generation.comfyui_client._SESSION.get", fake_get)
     monkeypatch.setattr("scripts.generation.retry.random.random", lambda: 0.0)
     monkeypatch.setattr(comfy, "VIEW_GET_RETRY_MAX_ATTEMPTS", 1)
 
@@ -822,7 +1130,7 @@ def test_view_download_does_not_retry_http_400(
         _ = (url, timeout, params, stream)
         return MockResponse(status_code=400)
 
-    monkeypatch.setattr("scripts.generation.comfyui_client.requests.get", fake_get)
+    monkeypatch.setattr("scripts.generation.comfyui_client._SESSION.get", fake_get)
     monkeypatch.setattr("scripts.generation.retry.random.random", lambda: 0.0)
 
     with pytest.raises(comfy.ComfyUIRequestError) as exc:
@@ -836,3 +1144,88 @@ def test_view_download_does_not_retry_http_400(
     assert attempts == 1
     assert exc.value.code == "http_request_failed"
     assert exc.value.context["status_code"] == 400
+
+
+def test_build_http_url_is_memoized_and_invalid_base_url_still_raises() -> None:
+    first = comfy._build_http_url("http://127.0.0.1:8188/", "view")
+    second = comfy._build_http_url("http://127.0.0.1:8188/", "view")
+
+    assert first == "http://127.0.0.1:8188/view"
+    assert second is first
+
+    for _ in range(2):
+        with pytest.raises(comfy.ComfyUIClientError) as exc:
+            _ = comfy._build_http_url("ftp://example.com", "view")
+        assert exc.value.code == "invalid_base_url"
+
+
+def test_comfy_ws_wait_prompt_done_prefilter_keeps_compact_terminal_frames() -> None:
+    ws = FakeWebSocket(
+        messages=[
+            json.dumps(
+                {"type": "progress", "data": {"prompt_id": "p-1", "value": 3}},
+            ),
+            json.dumps(
+                {"type": "executing", "data": {"prompt_id": "p-1", "node": None}},
+                separators=(",", ":"),
+            ),
+        ]
+    )
+
+    comfy.comfy_ws_wait_prompt_done(
+        ws=ws,
+        prompt_id="p-1",
+        request_timeout_s=0.2,
+        job_timeout_s=1.0,
+    )
+
+    assert ws._messages == []
+
+
+def test_comfy_ws_wait_prompt_done_prefilter_keeps_executing_frame_without_node() -> (
+    None
+):
+    ws = FakeWebSocket(
+        messages=[
+            json.dumps(
+                {"type": "executing", "data": {"prompt_id": "p-1", "node": "7"}},
+            ),
+            json.dumps({"type": "executing", "data": {"prompt_id": "p-1"}}),
+            json.dumps(
+                {"type": "executing", "data": {"prompt_id": "p-1", "node": "8"}},
+            ),
+        ]
+    )
+
+    comfy.comfy_ws_wait_prompt_done(
+        ws=ws,
+        prompt_id="p-1",
+        request_timeout_s=0.2,
+        job_timeout_s=1.0,
+    )
+
+    assert len(ws._messages) == 1
+
+
+def test_comfy_configure_http_pool_closes_replaced_adapter_and_skips_same_size(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    session = comfy._build_session()
+    monkeypatch.setattr(comfy, "_SESSION", session)
+    monkeypatch.setattr(comfy, "_SESSION_POOL_MAXSIZE", comfy.HTTP_POOL_MAXSIZE)
+    original = session.get_adapter("http://")
+    closed: list[object] = []
+    monkeypatch.setattr(original, "close", lambda: closed.append(original))
+
+    comfy.comfy_configure_http_pool(comfy.HTTP_POOL_MAXSIZE)
+    assert session.get_adapter("http://") is original
+    assert closed == []
+
+    comfy.comfy_configure_http_pool(comfy.HTTP_POOL_MAXSIZE + 8)
+    replaced = session.get_adapter("http://")
+    assert replaced is not original
+    assert session.get_adapter("https://") is replaced
+    assert closed == [original]
+
+    with pytest.raises(ValueError):
+        comfy.comfy_configure_http_pool(0)
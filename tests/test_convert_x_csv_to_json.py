@@ -8,6 +8,7 @@ ROOT = Path(__file__).resolve().parents[1]
 sys.path.insert(0, str(ROOT))
 
 from scripts.other.convert_x_csv_to_json import convert_csv_to_json
+from scripts.other.convert_y_csv_to_json import parse_weighted_tags
 
 
 def test_convert_x_csv_to_json_maps_type_and_descriptions(tmp_path: Path) -> None:
@@ -58,3 +59,47 @@ def test_convert_x_csv_to_json_fallbacks_when_columns_empty_or_missing(
     item = payload["items"][0]
     assert item["info"]["type"] == "sfw"
     assert item["description"] == {"zh": "", "en": ""}
+
+
+def test_convert_x_csv_to_json_replaces_output_atomically(tmp_path: Path) -> None:
+    csv_path = tmp_path / "x.csv"
+    out_dir = tmp_path / "out"
+    out_dir.mkdir()
+    out_path = out_dir / "x.json"
+    out_path.write_text("stale", encoding="utf-8")
+
+    csv_path.write_text(
+        "Gender tags,Type\n" + '"1girl,",normal\n',
+        encoding="utf-8",
+    )
+
+    convert_csv_to_json(csv_path, out_path, schema="s", item_type="sfw")
+
+    text = out_path.read_text(encoding="utf-8")
+    assert text.endswith("}\n")
+    assert json.loads(text)["schema"] == "s"
+    assert [path.name for path in out_dir.iterdir()] == ["x.json"]
+
+
+def test_parse_weighted_tags_depth_weights_match_pow_rules() -> None:
+    tags = parse_weighted_tags("a, (b, [c]), ((d))" + "(" * 40 + "e")
+
+    assert [(tag["text"], tag["weight"]) for tag in tags] == [
+        ("a", 1.0),
+        ("b", 1.1),
+        ("c", 0.99),
+        ("d", 1.21),
+        ("e", round(1.1**40, 3)),
+    ]
+
+
+def test_parse_weighted_tags_respects_escapes_and_unmatched_closers() -> None:
+    tags = parse_weighted_tags(r"a\(b\), c\\(d), e) f]，g")
+
+    assert [(tag["text"], tag["weight"]) for tag in tags] == [
+        (r"a\(b\)", 1.0),
+        ("c\\\\", 1.0),
+        ("d", 1.1),
+        ("e f", 1.0),
+        ("g", 1.0),
+    ]
@@ -4,6 +4,7 @@ from typing import cast
 
 import pytest
 
+import main as main_module
 from main import main
 
 
@@ -65,3 +66,18 @@ def test_main_propagates_invalid_args_exit_code() -> None:
         _ = main(["--invalid-arg"])
 
     assert exc_info.value.code == 2
+
+
+def test_resolve_dotenv_path_sees_env_file_created_later(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(main_module, "find_dotenv", lambda **_kwargs: "")
+    assert main_module._resolve_dotenv_path() == ""
+
+    dotenv_file = tmp_path / ".env"
+    _ = dotenv_file.write_text("COMFYUI_BASE_URL=http://127.0.0.1:8188\n")
+    assert main_module._resolve_dotenv_path() == str(dotenv_file)
+
+    dotenv_file.unlink()
+    assert main_module._resolve_dotenv_path() == ""
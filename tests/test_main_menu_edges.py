@@ -118,7 +118,7 @@ def test_system_exit_zero_is_handled_and_menu_continues(
 
     assert exit_code == 0
     assert "Script exited with exit code: 0" in events
-    assert events.count("Available scripts:") >= 2
+    assert "\n".join(events).splitlines().count("Available scripts:") >= 2
 
 
 def test_system_exit_nonzero_is_handled_and_menu_continues(
@@ -145,7 +145,7 @@ def test_system_exit_nonzero_is_handled_and_menu_continues(
 
     assert exit_code == 0
     assert "Script exited with exit code: 2" in events
-    assert events.count("Available scripts:") >= 2
+    assert "\n".join(events).splitlines().count("Available scripts:") >= 2
 
 
 def test_unexpected_exception_is_controlled_and_menu_continues(
@@ -173,4 +173,25 @@ def test_unexpected_exception_is_controlled_and_menu_continues(
     assert exit_code == 0
     assert "Script execution failed: boom" in events
     assert "Traceback" not in "\n".join(events)
-    assert events.count("Available scripts:") >= 2
+    assert "\n".join(events).splitlines().count("Available scripts:") >= 2
+
+
+@pytest.mark.parametrize(
+    "line",
+    [
+        "",
+        "--x-limit 2 --y-limit 3",
+        "  --dry-run\t--verbose  ",
+        '--prompt "a b" --seed 1',
+        "--name 'x y' --path a\\ b",
+        "--label 中文",
+    ],
+)
+def test_split_and_join_argv_match_shlex(line: str) -> None:
+    import shlex
+
+    from scripts.cli.menu import _join_argv, _split_argv
+
+    expected = shlex.split(line)
+    assert _split_argv(line) == expected
+    assert _join_argv(expected) == shlex.join(expected)
@@ -169,6 +169,29 @@ def test_main_menu_convert_uses_dotenv_default_csv(
     monkeypatch.delenv("CONVERT_Y_DEFAULT_CSV", raising=False)
 
 
+def test_autoload_dotenv_walks_parents_and_honors_skip_env(
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: Path,
+) -> None:
+    nested = tmp_path / "a" / "b"
+    nested.mkdir(parents=True)
+    _ = (tmp_path / ".env").write_text(
+        "SDLAB_TEST_DOTENV_KEY=from-parent\n",
+        encoding="utf-8",
+    )
+    monkeypatch.chdir(nested)
+    monkeypatch.delenv("SDLAB_TEST_DOTENV_KEY", raising=False)
+
+    monkeypatch.setenv(main_module.SKIP_DOTENV_ENV, "1")
+    main_module._autoload_dotenv()
+    assert "SDLAB_TEST_DOTENV_KEY" not in os.environ
+
+    monkeypatch.delenv(main_module.SKIP_DOTENV_ENV)
+    main_module._autoload_dotenv()
+    assert os.environ["SDLAB_TEST_DOTENV_KEY"] == "from-parent"
+    monkeypatch.delenv("SDLAB_TEST_DOTENV_KEY", raising=False)
+
+
 def test_main_menu_flag_non_tty_prints_reason_and_returns_2(
     monkeypatch: pytest.MonkeyPatch,
 ) -> None:
@@ -231,3 +254,23 @@ def test_main_passthrough_keeps_none_argv_shape(
 
     assert exit_code == 11
     assert captured["argv"] is None
+
+
+def test_menu_io_caches_tty_detection_until_invalidated() -> None:
+    from scripts.cli.io import MenuIO
+
+    calls = {"stdin": 0}
+
+    def _stdin_isatty() -> bool:
+        calls["stdin"] += 1
+        return True
+
+    io = MenuIO(stdin_isatty=_stdin_isatty, stdout_isatty=lambda: True)
+
+    assert io.is_interactive() is True
+    assert io.is_interactive() is True
+    assert calls["stdin"] == 1
+
+    io.invalidate()
+    assert io.is_interactive() is True
+    assert calls["stdin"] == 2
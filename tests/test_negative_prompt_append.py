@@ -206,7 +206,11 @@ def _build_worker_context(default_negative_prompt: str) -> runner.WorkflowContex
     )
 
 
-def _build_worker_plan(x_info_type: str) -> runner._CellPlan:
+def _build_worker_plan(
+    args: argparse.Namespace,
+    workflow_context: runner.WorkflowContext,
+    x_info_type: str,
+) -> runner._CellPlan:
     x_row = {
         "gender": "1girl,",
         "characters": "amiya,",
@@ -219,15 +223,18 @@ def _build_worker_plan(x_info_type: str) -> runner._CellPlan:
     return runner._CellPlan(
         x_index=0,
         y_index=1,
-        x_row=x_row,
         y_value="artist-a,",
         positive_prompt="1girl,amiya,",
         prompt_hash="hash1234",
         seed=42,
-        generation_params={"seed": 42},
+        generation_params=runner._effective_generation_params(
+            args, workflow_context, x_row, seed=42
+        ),
         workflow_hash="wf-hash",
         save_image_prefix="run/x0-y1",
         x_description={"zh": "", "en": ""},
+        x_fields=runner._project_x_fields(x_row),
+        x_info_type=runner._extract_x_info_type(x_row),
     )
 
 
@@ -268,12 +275,12 @@ def test_negative_prompt_append_applies_only_to_normal(
     normal_outcome = runner._worker_submit_and_wait(
         args,
         workflow_context,
-        _build_worker_plan("normal"),
+        _build_worker_plan(args, workflow_context, "normal"),
     )
     non_normal_outcome = runner._worker_submit_and_wait(
         args,
         workflow_context,
-        _build_worker_plan("lora"),
+        _build_worker_plan(args, workflow_context, "lora"),
     )
 
     assert normal_outcome.record is None
@@ -322,9 +329,55 @@ def test_negative_prompt_append_uses_override_base(
     outcome = runner._worker_submit_and_wait(
         args,
         workflow_context,
-        _build_worker_plan("normal"),
+        _build_worker_plan(args, workflow_context, "normal"),
     )
 
     assert outcome.record is None
     assert outcome.download is not None
     assert captured_negative_prompts == ["manual override, custom append,"]
+
+
+def test_worker_submits_negative_prompt_from_plan_generation_params(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    args = _build_worker_args()
+    workflow_context = _build_worker_context(default_negative_prompt="lowres,")
+    captured_negative_prompts: list[str] = []
+
+    def fake_patch_workflow(
+        *args: object, **kwargs: object
+    ) -> dict[str, dict[str, str]]:
+        _ = args
+        negative_prompt = kwargs.get("negative_prompt")
+        assert isinstance(negative_prompt, str)
+        captured_negative_prompts.append(negative_prompt)
+        return {"3": {}}
+
+    monkeypatch.setenv("COMFYUI_APPEND_NEGATIVE_PROMPT", "planned,")
+    plan = _build_worker_plan(args, workflow_context, "normal")
+    # 计划生成后再改环境变量：提交的负面提示词仍须与记录进 metadata 的一致
+    monkeypatch.setenv("COMFYUI_APPEND_NEGATIVE_PROMPT", "changed,")
+    monkeypatch.setattr(runner, "patch_workflow", fake_patch_workflow)
+    monkeypatch.setattr(runner, "comfy_submit_prompt", lambda **_kwargs: "pid-789")
+    monkeypatch.setattr(
+        runner, "comfy_wait_prompt_done_with_fallback", lambda **_kwargs: None
+    )
+
+    outcome = runner._worker_submit_and_wait(args, workflow_context, plan)
+
+    assert outcome.download is not None
+    assert captured_negative_prompts == ["lowres, planned,"]
+    assert plan.generation_params["negative_prompt"] == "lowres, planned,"
+
+
+def test_worker_without_negative_prompt_records_failure() -> None:
+    args = _build_worker_args()
+    workflow_context = _build_worker_context(default_negative_prompt="lowres,")
+    plan = _build_worker_plan(args, workflow_context, "lora")
+    plan.generation_params["negative_prompt"] = None
+
+    outcome = runner._worker_submit_and_wait(args, workflow_context, plan)
+
+    assert outcome.download is None
+    assert outcome.record is not None
+    assert outcome.record["status"] == "failed"
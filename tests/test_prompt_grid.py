@@ -1,6 +1,7 @@
 # pyright: reportMissingImports=false, reportUnknownVariableType=false, reportUnknownMemberType=false, reportUnknownArgumentType=false
 
 import hashlib
+import re
 import sys
 from pathlib import Path
 
@@ -75,6 +76,24 @@ def test_normalize_prompt_whitespace_and_comma_rules_keep_case():
     assert normalized == "A, B, C, d"
 
 
+def test_normalize_prompt_matches_regex_rules_on_comma_and_unicode_edges():
+    cases = [
+        "",
+        " \t\n ",
+        "a , , b",
+        ",a,",
+        "a ,",
+        " , ",
+        "a,,b",
+        "a\u3000,\xa0b",
+        "(x:1.1) ,\x1cy",
+    ]
+
+    for raw in cases:
+        expected = re.sub(r"\s*,\s*", ", ", re.sub(r"\s+", " ", raw.strip()))
+        assert normalize_prompt(raw) == expected
+
+
 def test_compute_prompt_hash_uses_normalized_prompt_sha256_hex():
     prompt = "  A ,B,\nC  "
     expected = hashlib.sha256("A, B, C".encode("utf-8")).hexdigest()
@@ -24,6 +24,13 @@ COMFY_ENV_KEYS = [
     "COMFYUI_REQUEST_TIMEOUT_S",
     "COMFYUI_JOB_TIMEOUT_S",
     "COMFYUI_CONCURRENCY",
+    "COMFYUI_GEN_CONCURRENCY",
+    "COMFYUI_DL_CONCURRENCY",
+    "COMFYUI_METADATA_FSYNC_EACH_RECORD",
+    "COMFYUI_HISTORY_RETRY_MAX_ATTEMPTS",
+    "COMFYUI_HISTORY_RETRY_STOP_AFTER_DELAY_S",
+    "COMFYUI_VIEW_RETRY_MAX_ATTEMPTS",
+    "COMFYUI_VIEW_RETRY_STOP_AFTER_DELAY_S",
     "COMFYUI_NEGATIVE_PROMPT",
     "COMFYUI_APPEND_NEGATIVE_PROMPT",
     "COMFYUI_WIDTH",
@@ -126,6 +133,9 @@ def test_cli_help_contains_required_flags() -> None:
         "--base-url",
         "--request-timeout-s",
         "--job-timeout-s",
+        "--concurrency",
+        "--gen-concurrency",
+        "--dl-concurrency",
         "--client-id",
         "--negative-prompt",
         "--width",
@@ -280,7 +290,7 @@ def test_dry_run_does_not_call_comfyui_client(
         should_not_be_called,
     )
     monkeypatch.setattr(
-        "scripts.generation.comfyui_part1_generate.comfy_download_image_to_path",
+        "scripts.generation.comfyui_part1_generate.comfy_download_images_to_paths",
         should_not_be_called,
     )
 
@@ -608,3 +618,79 @@ def test_dry_run_x_json_missing_description_uses_default(
         record.get("x_description") == {"zh": "", "en": ""}
         for record in metadata_records
     )
+
+
+def test_dry_run_gen_and_dl_concurrency_default_to_concurrency(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    _clear_comfy_env(monkeypatch)
+    monkeypatch.chdir(tmp_path)
+    x_csv, y_csv = _write_json_inputs(tmp_path)
+    run_dir = tmp_path / "run-concurrency"
+    from scripts.generation import comfyui_part1_generate as runner
+
+    pool_sizes: list[int] = []
+    monkeypatch.setattr(runner, "comfy_configure_http_pool", pool_sizes.append)
+
+    exit_code = main(
+        [
+            "--dry-run",
+            "--x-json",
+            str(x_csv),
+            "--y-json",
+            str(y_csv),
+            "--run-dir",
+            str(run_dir),
+            "--concurrency",
+            "3",
+            "--dl-concurrency",
+            "6",
+        ]
+    )
+
+    assert exit_code == 0
+    run_payload = json.loads((run_dir / "run.json").read_text(encoding="utf-8"))
+    assert run_payload["concurrency"] == 3
+    assert run_payload["gen_concurrency"] == 3
+    assert run_payload["dl_concurrency"] == 6
+    # dry-run 不发请求，不应调整共享连接池
+    assert pool_sizes == []
+
+
+@pytest.mark.parametrize(
+    ("env_name", "raw"),
+    [
+        ("COMFYUI_HISTORY_RETRY_MAX_ATTEMPTS", "two"),
+        ("COMFYUI_VIEW_RETRY_MAX_ATTEMPTS", "0"),
+        ("COMFYUI_VIEW_RETRY_STOP_AFTER_DELAY_S", "-1"),
+    ],
+)
+def test_invalid_retry_budget_env_fails_once_at_startup(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+    env_name: str,
+    raw: str,
+) -> None:
+    _clear_comfy_env(monkeypatch)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv(env_name, raw)
+    x_csv, y_csv = _write_json_inputs(tmp_path)
+    run_dir = tmp_path / "run-bad-retry"
+
+    exit_code = main(
+        [
+            "--dry-run",
+            "--x-json",
+            str(x_csv),
+            "--y-json",
+            str(y_csv),
+            "--run-dir",
+            str(run_dir),
+        ]
+    )
+
+    assert exit_code == 2
+    assert env_name in capsys.readouterr().err
+    assert not run_dir.exists()
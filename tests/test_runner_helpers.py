@@ -0,0 +1,305 @@
+# pyright: basic, reportMissingImports=false, reportUnusedCallResult=false
+
+import hashlib
+import json
+import os
+import sys
+import typing
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from scripts.generation import comfyui_part1_generate as runner
+from scripts.generation.comfyui_part1_generate import build_parser
+from scripts.generation.prompt_grid import compute_prompt_hash, render_positive_prompt
+
+
+def _clear_comfy_env(monkeypatch: pytest.MonkeyPatch) -> None:
+    for key in list(os.environ):
+        if key.startswith("COMFYUI_"):
+            monkeypatch.delenv(key)
+
+
+def test_sha256_file_reuses_digest_until_file_changes(tmp_path: Path) -> None:
+    runner._sha256_file_cached.cache_clear()
+    target = tmp_path / "workflow.json"
+    _ = target.write_bytes(b'{"a": 1}')
+
+    first = runner._sha256_file(target)
+    assert first == hashlib.sha256(b'{"a": 1}').hexdigest()
+    assert runner._sha256_file(target) == first
+
+    _ = target.write_bytes(b'{"a": 22}')
+    stat = target.stat()
+    os.utime(target, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert runner._sha256_file(target) == hashlib.sha256(b'{"a": 22}').hexdigest()
+
+    # 同尺寸改写且 mtime 不变（粗粒度时间戳）时，ctime 变化仍会让缓存失效
+    stat = target.stat()
+    _ = target.write_bytes(b'{"a": 33}')
+    os.utime(target, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert runner._sha256_file(target) == hashlib.sha256(b'{"a": 33}').hexdigest()
+    assert runner._sha256_file_cached.cache_info().maxsize is not None
+
+
+def test_metadata_writer_batches_fsync_and_flushes_each_line(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    fsync_calls: list[int] = []
+    monkeypatch.setattr(runner.os, "fsync", fsync_calls.append)
+    monkeypatch.setattr(runner, "monotonic", lambda: 0.0)
+    monkeypatch.setattr(runner, "METADATA_FSYNC_MAX_PENDING", 4)
+
+    metadata_path = tmp_path / "metadata.jsonl"
+    with runner._metadata_writer(metadata_path) as writer:
+        for index in range(5):
+            writer.append({"x_index": index, "y_index": 0})
+            lines = metadata_path.read_text(encoding="utf-8").splitlines()
+            assert len(lines) == index + 1
+        assert len(fsync_calls) == 1
+
+    assert len(fsync_calls) == 2
+    records = [
+        json.loads(line)
+        for line in metadata_path.read_text(encoding="utf-8").splitlines()
+    ]
+    assert [record["x_index"] for record in records] == [0, 1, 2, 3, 4]
+
+
+def test_metadata_writer_env_restores_per_record_fsync(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    fsync_calls: list[int] = []
+    monkeypatch.setattr(runner.os, "fsync", fsync_calls.append)
+    monkeypatch.setattr(runner, "monotonic", lambda: 0.0)
+    monkeypatch.setenv("COMFYUI_METADATA_FSYNC_EACH_RECORD", "1")
+
+    with runner._metadata_writer(tmp_path / "metadata.jsonl") as writer:
+        for index in range(3):
+            writer.append({"x_index": index, "y_index": 0})
+        assert len(fsync_calls) == 3
+
+    assert len(fsync_calls) == 3
+
+
+def test_compile_template_validates_once_and_renders_cells() -> None:
+    assert runner._compile_template(runner.DEFAULT_TEMPLATE) is None
+
+    compiled = runner._compile_template("{y} {gender}{quality}")
+    assert compiled == ("y", "gender", "quality")
+    x_row = {"gender": "1girl", "quality": "masterpiece,"}
+    assert (
+        runner._render_compiled_template(compiled, x_row, "smile")
+        == "smile,1girl,masterpiece,"
+    )
+
+    full_row = {
+        "gender": " 1girl ",
+        "characters": "amiya,",
+        "series": "",
+        "rating": "safe",
+        "general": "solo,",
+        "quality": "masterpiece",
+    }
+    assert runner._render_compiled_template(
+        None, full_row, "artist-a"
+    ) == render_positive_prompt(full_row, "artist-a")
+
+    with pytest.raises(ValueError, match="未知占位符"):
+        runner._compile_template("{gender}{unknown}")
+    with pytest.raises(ValueError, match="仅支持由占位符组成"):
+        runner._compile_template("{gender} literal")
+
+
+def test_load_latest_metadata_records_keeps_latest_selected_records(
+    tmp_path: Path,
+) -> None:
+    metadata_path = tmp_path / "metadata.jsonl"
+    lines = [
+        json.dumps({"x_index": 0, "y_index": 0, "status": "failed"}),
+        json.dumps({"x_index": 0, "y_index": 0, "status": "success", "seed": 7}),
+        "not json",
+        json.dumps({"x_index": "1", "y_index": 2, "status": "skipped"}),
+        json.dumps({"x_index": 3, "y_index": 0, "status": "success"}),
+        '{"x_index": 0, "y_index": 0, "status": "fail',
+    ]
+    metadata_path.write_text("\n".join(lines), encoding="utf-8")
+
+    latest = runner._load_latest_metadata_records(metadata_path)
+    assert latest == {
+        (0, 0): {"x_index": 0, "y_index": 0, "status": "success", "seed": 7},
+        (1, 2): {"x_index": "1", "y_index": 2, "status": "skipped"},
+        (3, 0): {"x_index": 3, "y_index": 0, "status": "success"},
+    }
+
+    selected = runner._load_latest_metadata_records(
+        metadata_path,
+        x_indexes=frozenset({0, 1}),
+        y_indexes=frozenset({0}),
+    )
+    assert selected == {
+        (0, 0): {"x_index": 0, "y_index": 0, "status": "success", "seed": 7},
+    }
+    assert runner._load_latest_metadata_records(tmp_path / "missing.jsonl") == {}
+
+
+def test_should_resume_skip_uses_prescanned_image_names(tmp_path: Path) -> None:
+    images_dir = tmp_path / "images"
+    images_dir.mkdir()
+    (images_dir / "x0-y0.png").write_bytes(b"png")
+    (images_dir / "nested").mkdir()
+
+    existing_image_names = runner._scan_existing_image_names(images_dir)
+    assert existing_image_names == frozenset({"x0-y0.png"})
+    assert runner._scan_existing_image_names(tmp_path / "missing") == frozenset()
+
+    record: dict[str, object] = {
+        "status": "success",
+        "prompt_hash": "hash",
+        "seed": 1,
+        "workflow_hash": "wf",
+        "local_image_paths": ["images/x0-y0.png"],
+    }
+
+    def should_skip(names: frozenset[str] | None) -> bool:
+        return runner._should_resume_skip(
+            existing=record,
+            run_dir=tmp_path,
+            expected_prompt_hash="hash",
+            expected_seed=1,
+            expected_workflow_hash="wf",
+            existing_image_names=names,
+        )
+
+    assert should_skip(existing_image_names) is True
+    assert should_skip(frozenset()) is False
+    assert should_skip(None) is True
+
+    record["local_image_paths"] = ["images/x0-y0.png", "images/x0-y0-1.png"]
+    assert should_skip(existing_image_names) is False
+
+
+def test_write_bytes_atomic_replaces_target_without_leftovers(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    target = tmp_path / "run.json"
+    target.write_text("old", encoding="utf-8")
+
+    runner._write_bytes_atomic(target, b'{"run_id": "new"}')
+    assert target.read_bytes() == b'{"run_id": "new"}'
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["run.json"]
+
+    def failing_replace(src: object, dst: object) -> None:
+        raise OSError("replace failed")
+
+    monkeypatch.setattr(runner.os, "replace", failing_replace)
+    with pytest.raises(OSError, match="replace failed"):
+        runner._write_bytes_atomic(target, b"broken")
+    assert target.read_bytes() == b'{"run_id": "new"}'
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["run.json"]
+
+
+def test_fetch_remote_images_backs_off_history_polls(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    history_items: list[dict[str, object]] = [{}] * 5 + [
+        {"outputs": {"9": {"images": [{"filename": "a.png", "type": "output"}]}}}
+    ]
+    sleeps: list[float] = []
+    monkeypatch.setattr(
+        runner,
+        "comfy_get_history_item",
+        lambda **_kwargs: history_items.pop(0),
+    )
+    monkeypatch.setattr(runner, "sleep", sleeps.append)
+
+    images = runner._fetch_remote_images_with_retry(
+        base_url="http://example.invalid",
+        prompt_id="p1",
+        request_timeout_s=1.0,
+        job_timeout_s=60.0,
+    )
+
+    assert [image["filename"] for image in images] == ["a.png"]
+    assert sleeps == [0.05, 0.1, 0.2, 0.4, 0.4]
+
+
+def test_coerce_int_or_none_handles_each_input_type() -> None:
+    assert runner._coerce_int_or_none(7) == 7
+    assert runner._coerce_int_or_none(True) is None
+    assert runner._coerce_int_or_none(3.0) == 3
+    assert runner._coerce_int_or_none(3.5) is None
+    assert runner._coerce_int_or_none(" 12 ") == 12
+    assert runner._coerce_int_or_none("x") is None
+    assert runner._coerce_int_or_none(None) is None
+
+
+def test_ensure_newline_terminated_appends_only_when_missing(tmp_path: Path) -> None:
+    missing = tmp_path / "missing.jsonl"
+    runner._ensure_newline_terminated(missing)
+    assert not missing.exists()
+
+    empty = tmp_path / "empty.jsonl"
+    empty.write_bytes(b"")
+    runner._ensure_newline_terminated(empty)
+    assert empty.read_bytes() == b""
+
+    complete = tmp_path / "complete.jsonl"
+    complete.write_bytes(b'{"a": 1}\n')
+    runner._ensure_newline_terminated(complete)
+    assert complete.read_bytes() == b'{"a": 1}\n'
+
+    broken = tmp_path / "broken.jsonl"
+    broken.write_bytes(b'{"a": 1}\n{"b"')
+    runner._ensure_newline_terminated(broken)
+    assert broken.read_bytes() == b'{"a": 1}\n{"b"\n'
+
+
+def test_cell_plan_prompt_hash_matches_full_prompt_hash(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    _clear_comfy_env(monkeypatch)
+    args = build_parser().parse_args([])
+    x_selected = [
+        runner.SelectedRow(
+            index=0,
+            value={
+                "gender": " 1girl ,",
+                "characters": "amiya\n(arknights)",
+                "rating": ",",
+                "general": "solo ,  smile",
+                "quality": "",
+            },
+        ),
+        runner.SelectedRow(index=3, value={}),
+    ]
+    y_selected = [
+        runner.SelectedRow(index=0, value={"y": " artist a ,, b "}),
+        runner.SelectedRow(index=1, value={"y": ""}),
+        runner.SelectedRow(index=2, value={"y": "\tc　,d"}),
+    ]
+
+    for template in (None, ("y", "gender", "y", "quality"), ("general",)):
+        plans = list(
+            runner._build_cell_plans(
+                args=args,
+                compiled_template=template,
+                x_selected=x_selected,
+                y_selected=y_selected,
+                x_desc_by_index={0: {}, 3: {}},
+                workflow_context=None,
+                workflow_hash="not_loaded",
+                run_id="run",
+            )
+        )
+        assert len(plans) == 6
+        for plan in plans:
+            assert plan.prompt_hash == compute_prompt_hash(plan.positive_prompt)
+
+
+def test_prepare_prompt_hash_parts_type_hints_resolve_at_runtime() -> None:
+    hints = typing.get_type_hints(runner._prepare_prompt_hash_parts)
+    assert "return" in hints
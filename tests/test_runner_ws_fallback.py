@@ -42,26 +42,32 @@ def _build_workflow_context() -> runner.WorkflowContext:
     )
 
 
-def _build_plan() -> runner._CellPlan:
+def _build_plan(
+    args: argparse.Namespace, workflow_context: runner.WorkflowContext
+) -> runner._CellPlan:
+    x_row = {
+        "gender": "1girl,",
+        "characters": "amiya,",
+        "series": "arknights,",
+        "rating": "safe,",
+        "general": "solo,",
+        "quality": "masterpiece,",
+    }
     return runner._CellPlan(
         x_index=0,
         y_index=1,
-        x_row={
-            "gender": "1girl,",
-            "characters": "amiya,",
-            "series": "arknights,",
-            "rating": "safe,",
-            "general": "solo,",
-            "quality": "masterpiece,",
-        },
         y_value="artist-a,",
         positive_prompt="1girl,amiya,",
         prompt_hash="hash1234",
         seed=42,
-        generation_params={"seed": 42},
+        generation_params=runner._effective_generation_params(
+            args, workflow_context, x_row, seed=42
+        ),
         workflow_hash="wf-hash",
         save_image_prefix="run/x0-y1",
         x_description={"zh": "", "en": ""},
+        x_fields=runner._project_x_fields(x_row),
+        x_info_type=runner._extract_x_info_type(x_row),
     )
 
 
@@ -70,7 +76,7 @@ def test_worker_submit_and_wait_uses_fallback_wait_and_returns_download(
 ) -> None:
     args = _build_args()
     workflow_context = _build_workflow_context()
-    plan = _build_plan()
+    plan = _build_plan(args, workflow_context)
 
     called: dict[str, object] = {}
 
@@ -120,7 +126,7 @@ def test_worker_submit_and_wait_serializes_execution_error_as_failed_record(
 ) -> None:
     args = _build_args()
     workflow_context = _build_workflow_context()
-    plan = _build_plan()
+    plan = _build_plan(args, workflow_context)
 
     monkeypatch.setattr(runner, "patch_workflow", lambda *args, **kwargs: {"3": {}})
     monkeypatch.setattr(
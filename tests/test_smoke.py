@@ -1,5 +1,11 @@
 """烟雾测试 - 验证基础环境和依赖正常工作"""
 
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
 
 def test_smoke():
     assert True
@@ -13,3 +19,19 @@ def test_dependencies_available():
     assert requests is not None
     assert websocket is not None
     assert dotenv is not None
+
+
+def test_menu_import_path_does_not_load_http_stack():
+    code = (
+        "import sys; import main; import scripts.cli; "
+        "print(sorted(m for m in ('requests', 'websocket', 'tqdm') if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert result.stdout.strip() == "[]"